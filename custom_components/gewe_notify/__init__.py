@@ -1,16 +1,38 @@
 import logging
 import os
-import json
-import asyncio
+import secrets
 from homeassistant.config_entries import ConfigEntry, ConfigEntryState
 from homeassistant.const import Platform, CONF_NAME
 from homeassistant.core import HomeAssistant, ServiceCall, ServiceResponse, SupportsResponse
-from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.aiohttp_client import async_create_clientsession, async_get_clientsession
 from homeassistant.helpers import discovery
-from .const import CONF_API_URL, DOMAIN, CONF_GEWE_TOKEN, CONF_APP_ID, CONF_WXID
+from homeassistant.helpers.start import async_at_started
+import homeassistant.helpers.config_validation as cv
+import voluptuous as vol
+from .const import CONF_API_URL, DOMAIN, CONF_GEWE_TOKEN, CONF_APP_ID, CONF_WXID, CONF_WEBHOOK_ID, CALLBACK_VIEW_URL
 from .notify import GeweNotifyService
 from .api import GeweAPI
-from .http_api import GeweContactsAPI
+from .http_api import GeweCallbackView, GeweContactsAPI, GeweMediaView
+from .media import GeweImageProcessor, GeweMediaStore
+from .media_cache import GeweForwardCache
+from .media_probe import GeweMediaProber
+from .link_preview import GeweLinkPreview
+from .login import GeweLoginWatcher
+from .callback import GeweCallbackReceiver
+from .media import resolve_url
+from .history import GeweMessageHistory
+from .chatroom import GeweChatroomMembers
+from .startup import GeweStartupTimer
+from .contacts import GeweContacts
+from .scheduler import GeweScheduler
+from .websocket_api import async_publish_message_status, async_setup_websocket
+from .accounts import (
+    GeweAccountRouter,
+    async_assign_account_name,
+    contacts_file_path,
+    notify_service_name,
+    resolve_account,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -20,32 +42,48 @@ PLATFORMS: list[Platform] = [
         Platform.NOTIFY
         ]
 
-def save_contacts_to_file(file_path, contacts):
-    """Saves contacts data to a file."""
-    try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(contacts, f, ensure_ascii=False, indent=4)
-        _LOGGER.info(f"Contacts data saved to {file_path}")
-    except Exception as e:
-        _LOGGER.error(f"Error saving contacts to file: {e}")
+SERVICES = [
+    "fetch_contacts",
+    "login",
+    "cancel_login",
+    "get_qrcode",
+    "set_callback",
+    "query_history",
+    "revoke_message",
+    "cancel_scheduled",
+]
+
+QUERY_HISTORY_SCHEMA = vol.Schema({
+    vol.Optional("account"): cv.string,
+    vol.Optional("to_wxid"): cv.string,
+    vol.Optional("msg_id"): vol.Coerce(int),
+    vol.Optional("since"): cv.datetime,
+    vol.Optional("message_type"): cv.string,
+    vol.Optional("limit", default=20): vol.All(vol.Coerce(int), vol.Range(min=1, max=500)),
+})
+
+# 至少指定一个条件，避免撤回任意账号发给任意人的最后一条消息
+REVOKE_MESSAGE_SCHEMA = vol.All(
+    vol.Schema({
+        vol.Optional("account"): cv.string,
+        vol.Optional("to_wxid"): cv.string,
+        vol.Optional("msg_id"): vol.Coerce(int),
+    }),
+    cv.has_at_least_one_key("msg_id", "to_wxid"),
+)
 
 async def fetch_contacts_formated_service(hass: HomeAssistant, entry: ConfigEntry, call: ServiceCall):
     """Call the fetch_contacts_formated method."""
     token = entry.data.get(CONF_GEWE_TOKEN)
     app_id = entry.data.get(CONF_APP_ID)
-    api = hass.data[DOMAIN].get("api")
-
-    if not api:
-        _LOGGER.error("API instance not found during fetch_contacts_formated_service")
-        return
+    api = hass.data[DOMAIN]["entries"][entry.entry_id]["api"]
 
     try:
         result = await api.fetch_contacts_formated(token, app_id)
         if result:
-            storage_path = hass.config.path(".storage/gewe_contacts.json")
-            os.makedirs(os.path.dirname(storage_path), exist_ok=True)
-            await hass.async_add_executor_job(save_contacts_to_file, storage_path, result)
-            _LOGGER.info(f"Contacts data saved to {storage_path}")
+            storage_path = contacts_file_path(hass, entry.entry_id)
+            # 保存文件并把变化推送给 websocket 订阅者
+            await hass.data[DOMAIN]["contacts"].async_replace(entry.entry_id, result)
 
             persistent_notification_data = {
                 "title": "Gewe 通讯录更新成功通知",
@@ -68,11 +106,9 @@ async def get_qrcode_service(hass: HomeAssistant, entry: ConfigEntry, call: Serv
     uuid = None
     qr_image_url = None
     # 从 config_entry 的 data 中提取之前保存的数据
-    api_url = entry.data.get(CONF_API_URL)
     token = entry.data.get(CONF_GEWE_TOKEN)
     app_id = entry.data.get(CONF_APP_ID)
-    wxid = entry.data.get(CONF_WXID)
-    api = hass.data[DOMAIN].get("api")
+    api = hass.data[DOMAIN]["entries"][entry.entry_id]["api"]
 
     # Logout the user
     if token and app_id:
@@ -85,165 +121,336 @@ async def get_qrcode_service(hass: HomeAssistant, entry: ConfigEntry, call: Serv
         uuid = qr_data["uuid"]
         qr_code_base64 = qr_data["qrImgBase64"]
 
-        # 保存 QR Code
-        qr_image_url = await api.save_qr_code_to_file(qr_code_base64)
+        # 缓存 QR Code
+        qr_image_url = api.store_qr_code(uuid, qr_code_base64)
         if qr_image_url:
-            _LOGGER.info(f"QR Code [ uuid: {uuid} ] saved and accessible at: {qr_image_url}")
+            _LOGGER.info(f"QR Code [ uuid: {uuid} ] accessible at: {qr_image_url}")
+            # 可能创建了新设备，登录检查必须使用新的 app_id
+            hass.data[DOMAIN]["entries"][entry.entry_id]["login_watcher"].remember_app_id(uuid, app_id)
             return {
                     "code": 1,
-                    "msg": f"successful. QR Code [ uuid: {uuid} ] saved and accessible at: {qr_image_url}",
+                    "msg": f"successful. QR Code [ uuid: {uuid} ] accessible at: {qr_image_url}",
                     "img_url": qr_image_url,
-                    "uuid": uuid
+                    "uuid": uuid,
+                    "app_id": app_id,
                     }
         else:
-            _LOGGER.debug("QR code save failed.")
-            return { 
+            _LOGGER.debug("QR code store failed.")
+            return {
                     "code": 0,
-                    "msg": "QR code save failed." 
+                    "msg": "QR code store failed."
                     }
     else:
         _LOGGER.debug("QR code fetch failed.")
-        return { 
+        return {
                 "code": 0,
-                "msg": "QR code fetch failed." 
+                "msg": "QR code fetch failed."
                 }
 
-async def login_service(hass: HomeAssistant, entry: ConfigEntry, call: ServiceCall):
-    """do login"""
-    scaned_flag = True    
+async def login_service(hass: HomeAssistant, entry: ConfigEntry, call: ServiceCall) -> dict:
+    """Start watching the login QR code in the background."""
     uuid = call.data.get("uuid", None)
-    qr_image_url = call.data.get("img_url", None)
-    # 从 config_entry 的 data 中提取之前保存的数据
-    api_url = entry.data.get(CONF_API_URL)
+    watcher = hass.data[DOMAIN]["entries"][entry.entry_id]["login_watcher"]
+    if not uuid:
+        return {"code": 0, "msg": "uuid is required."}
+    handle = watcher.async_start(uuid, call.data.get("app_id"))
+    _LOGGER.debug(f"Login watcher started: {handle}")
+    return {"code": 1, "msg": "watching", **handle}
+
+async def cancel_login_service(hass: HomeAssistant, entry: ConfigEntry, call: ServiceCall):
+    """Cancel the background login watcher."""
+    hass.data[DOMAIN]["entries"][entry.entry_id]["login_watcher"].async_cancel()
+
+async def set_callback_service(hass: HomeAssistant, entry: ConfigEntry, call: ServiceCall) -> dict:
+    """Point the Gewe backend's message callback at this integration."""
     token = entry.data.get(CONF_GEWE_TOKEN)
-    app_id = entry.data.get(CONF_APP_ID)
-    wxid = entry.data.get(CONF_WXID)
-    api = hass.data[DOMAIN].get("api")
-    retries = 0
-    if uuid and qr_image_url:
-        _LOGGER.debug(f"payload [ uuid: {uuid}, qr_image_url: {qr_image_url} ]" )
-        while scaned_flag and retries < 36:
-            _LOGGER.debug(f"Checking login QR code: {qr_image_url}.")
-            login_data = await api.check_login(token, app_id, uuid)
-            if login_data.get("loginInfo") and login_data["loginInfo"].get("wxid"):
-                scaned_flag = False
-                nickname = login_data["nickName"]
-                wxid = login_data["loginInfo"]["wxid"]
-                await api.save_token_to_file(token, app_id, wxid)
-                # 更新配置后，重新加载集成
-                config = dict(entry.data)
-                config.update({
-                    CONF_GEWE_TOKEN: token,
-                    CONF_APP_ID: app_id,
-                    CONF_WXID: wxid
-                    })
-                # 更新 token
-                hass.config_entries.async_update_entry(entry, data=config)
-                await hass.config_entries.async_reload(entry.entry_id)
-                _LOGGER.debug("Update entry (options)!!")
-                persistent_notification_data = {
-                    "title": "Gewe 登录成功",
-                    "message": f"您的账号{wxid}已登录成功。",
-                    "notification_id": "gewe_notify_loggin_successful"
-                }
-                # 调用 Home Assistant 服务发送持久化通知
-                await hass.services.async_call(
-                    "persistent_notification", "create", persistent_notification_data
-                )
-                return True
-            retries += 1
-            await asyncio.sleep(5)
-    return False
-
-async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
-    """Set up Gewe Notify integration as a config entry."""
-    _LOGGER.debug("Setting up Gewe Notify integration with entry: %s", entry.as_dict())
-
-    # 从 config entry 获取配置数据
-    api_url = entry.data[CONF_API_URL]
-    gewe_token = entry.data[CONF_GEWE_TOKEN]
-    app_id = entry.data[CONF_APP_ID]
-
-    # 将 API 客户端添加到 hass 数据中
-    session = async_get_clientsession(hass)
-    api = GeweAPI(hass, api_url, session)
-    hass.data.setdefault(DOMAIN, {})
-    hass.data[DOMAIN]["api"] = api
-    _LOGGER.debug(f"Instance {hass.data[DOMAIN]['api']} of Gewe Notify regeisted.")
-
-    # 注册自定义 HTTP API
-    api_view = GeweContactsAPI(hass)
-    hass.http.register_view(api_view)
-    hass.data[DOMAIN]["api_view"] = api_view
-    _LOGGER.debug("Custom Api of Gewe Notify regeisted.")
-
-    async def fetch_contacts_service_wrapper(call: ServiceCall):
-        await fetch_contacts_formated_service(hass, entry, call)
-
-    async def login_service_wrapper(call: ServiceCall):
-        await login_service(hass, entry, call)
+    api = hass.data[DOMAIN]["entries"][entry.entry_id]["api"]
+    callback_url = call.data.get("callback_url") or resolve_url(
+        hass, CALLBACK_VIEW_URL.format(webhook_id=entry.data[CONF_WEBHOOK_ID])
+    )
+    if await api.set_callback(token, callback_url) is None:
+        return {"code": 0, "msg": "set callback failed.", "callback_url": callback_url}
+    _LOGGER.info(f"Gewe callback set to {callback_url}")
+    return {"code": 1, "msg": "successful.", "callback_url": callback_url}
+
+async def query_history_service(hass: HomeAssistant, entry: ConfigEntry, call: ServiceCall) -> dict:
+    """Look up recently sent messages."""
+    history = hass.data[DOMAIN]["history"]
+    since = call.data.get("since")
+    messages = await history.async_query(
+        entry_id=entry.entry_id if call.data.get("account") else None,
+        to_wxid=call.data.get("to_wxid"),
+        msg_id=call.data.get("msg_id"),
+        since=since.timestamp() if since else None,
+        message_type=call.data.get("message_type"),
+        limit=call.data.get("limit", 20),
+    )
+    return {"messages": messages}
+
+async def revoke_message_service(hass: HomeAssistant, entry: ConfigEntry, call: ServiceCall) -> dict:
+    """Revoke a sent message found in the history, by msg_id or the latest to a recipient."""
+    if not call.data.get("to_wxid") and not call.data.get("msg_id"):
+        return {"code": 0, "msg": "msg_id or to_wxid is required."}
+    history = hass.data[DOMAIN]["history"]
+    messages = await history.async_query(
+        entry_id=entry.entry_id if call.data.get("account") else None,
+        to_wxid=call.data.get("to_wxid"),
+        msg_id=call.data.get("msg_id"),
+        limit=1,
+    )
+    if not messages or not messages[0]["new_msg_id"]:
+        return {"code": 0, "msg": "message not found."}
+    message = messages[0]
+    # 只能由发送这条消息的账号撤回
+    runtime = hass.data[DOMAIN]["entries"].get(message["entry_id"])
+    if runtime is None:
+        return {"code": 0, "msg": "account of the message is not loaded.", "message": message}
+    response = await runtime["api"].revoke_message(
+        runtime["entry"].data.get(CONF_GEWE_TOKEN),
+        runtime["entry"].data.get(CONF_APP_ID),
+        message["to_wxid"],
+        message["msg_id"],
+        message["new_msg_id"],
+        message["create_time"],
+    )
+    if response is None:
+        return {"code": 0, "msg": "revoke failed.", "message": message}
+    async_publish_message_status(
+        hass, runtime["entry"].entry_id, message["to_wxid"], message["message_type"], "revoked",
+        {"msgId": message["msg_id"], "newMsgId": message["new_msg_id"], "createTime": message["create_time"]},
+    )
+    return {"code": 1, "msg": "successful.", "message": message}
+
+async def cancel_scheduled_service(hass: HomeAssistant, entry: ConfigEntry, call: ServiceCall) -> dict:
+    """Cancel a notification queued with send_at/delay/quiet_hours."""
+    schedule_id = call.data.get("schedule_id")
+    if not schedule_id or not hass.data[DOMAIN]["scheduler"].async_cancel(schedule_id):
+        return {"code": 0, "msg": "scheduled message not found."}
+    return {"code": 1, "msg": "successful.", "schedule_id": schedule_id}
+
+def _async_register_services(hass: HomeAssistant):
+    """Register domain services once; each call picks its account via data.account."""
+
+    def wrap(service_func):
+        async def wrapper(call: ServiceCall) -> ServiceResponse:
+            runtime = resolve_account(hass, call.data.get("account"))
+            if runtime is None:
+                _LOGGER.error(f"Gewe account not found: {call.data.get('account')}")
+                return {"code": 0, "msg": "account not found."}
+            return await service_func(hass, runtime["entry"], call)
+        return wrapper
 
     async def get_qrcode_service_wrapper(call: ServiceCall) -> ServiceResponse:
         """Wraps the get_qrcode_service and ensures a response is returned."""
-        response = await get_qrcode_service(hass, entry, call)
-        
+        response = await wrap(get_qrcode_service)(call)
+
         # 确保返回 ServiceResponse 或类似对象
         if response:
             return response
         else:
             return {"code": 0, "msg": "No response from get_qrcode_service"}
 
-
     # 注册自定义服务
-    hass.services.async_register( DOMAIN, "fetch_contacts", fetch_contacts_service_wrapper)
-    hass.services.async_register( DOMAIN, "login", login_service_wrapper)
+    hass.services.async_register( DOMAIN, "fetch_contacts", wrap(fetch_contacts_formated_service))
+    hass.services.async_register( DOMAIN, "login", wrap(login_service), supports_response=SupportsResponse.OPTIONAL)
+    hass.services.async_register( DOMAIN, "cancel_login", wrap(cancel_login_service))
+    hass.services.async_register( DOMAIN, "set_callback", wrap(set_callback_service), supports_response=SupportsResponse.OPTIONAL)
+    hass.services.async_register(
+        DOMAIN, "query_history", wrap(query_history_service),
+        schema=QUERY_HISTORY_SCHEMA, supports_response=SupportsResponse.ONLY,
+    )
+    hass.services.async_register(
+        DOMAIN, "revoke_message", wrap(revoke_message_service),
+        schema=REVOKE_MESSAGE_SCHEMA, supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register( DOMAIN, "cancel_scheduled", wrap(cancel_scheduled_service), supports_response=SupportsResponse.OPTIONAL)
     hass.services.async_register( DOMAIN, "get_qrcode", get_qrcode_service_wrapper, supports_response=SupportsResponse.OPTIONAL)
     _LOGGER.debug("Action of Gewe Notify regeisted.")
 
+def _async_setup_shared(hass: HomeAssistant):
+    """Set up state shared by all accounts, once."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if "entries" in domain_data:
+        return domain_data
+    domain_data["entries"] = {}
+    domain_data["sessions"] = {}
+    domain_data["callback_receivers"] = {}
+    domain_data["router"] = GeweAccountRouter(hass)
+
+    # 注册自定义 HTTP API，视图只注册一次，重载集成时沿用同一个 media store
+    hass.http.register_view(GeweContactsAPI(hass))
+    hass.http.register_view(GeweCallbackView(hass))
+    media_store = domain_data.setdefault("media_store", GeweMediaStore(hass))
+    hass.http.register_view(GeweMediaView(media_store))
+    _LOGGER.debug("Custom Api of Gewe Notify regeisted.")
+
+    # 图片压缩/元数据探测/链接预览与账号无关，使用 HA 的共享 session
+    session = async_get_clientsession(hass)
+    domain_data["image_processor"] = GeweImageProcessor(hass, session, media_store)
+    domain_data["media_prober"] = GeweMediaProber(hass, session, media_store)
+    domain_data["link_preview"] = GeweLinkPreview(hass, session)
+    domain_data["forward_cache"] = GeweForwardCache(hass, session)
+    domain_data["chatroom_members"] = GeweChatroomMembers(hass)
+    domain_data["contacts"] = GeweContacts(hass)
+    domain_data["notify_services"] = {}
+    domain_data["scheduler"] = GeweScheduler(hass)
+    async_setup_websocket(hass)
+    domain_data["history"] = GeweMessageHistory(
+        hass, hass.config.path(".storage", "gewe_notify_history.db")
+    )
+    return domain_data
+
+async def _async_deferred_startup(hass: HomeAssistant, entry: ConfigEntry):
+    """Network validation and cache warm-up, run in the background after HA has started."""
+    domain_data = hass.data[DOMAIN]
+    runtime = domain_data["entries"].get(entry.entry_id)
+    if runtime is None:
+        return
+    timer = runtime["startup"]
+    if not domain_data.get("shared_loaded"):
+        # 共享的缓存只在第一个账号启动时加载
+        domain_data["shared_loaded"] = True
+        with timer.measure("deferred_forward_cache"):
+            await domain_data["forward_cache"].async_load()
+        with timer.measure("deferred_history"):
+            await domain_data["history"].async_warm()
+    # 每次启动都要重新开启定时器，任务只从 .storage 读取一次
+    with timer.measure("deferred_scheduler"):
+        await domain_data["scheduler"].async_start()
+
+    # 检查在线状态，同时让后端健康状态有初始数据
+    with timer.measure("deferred_check_online"):
+        online = await runtime["api"].check_online(
+            entry.data.get(CONF_GEWE_TOKEN), entry.data.get(CONF_APP_ID)
+        )
+    if online is not None:
+        runtime["receiver"].set_online(bool(online))
+
+    with timer.measure("deferred_contacts"):
+        await domain_data["chatroom_members"].async_load_remarks(entry)
+    timer.deferred_done = True
+    _LOGGER.debug("Gewe Notify deferred startup finished: %s", timer.as_dict())
+
+async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+    """Set up Gewe Notify integration as a config entry.
+
+    Only registration happens here; anything touching the network or disk
+    runs in the background once HA has started.
+    """
+    _LOGGER.debug("Setting up Gewe Notify integration with entry: %s", entry.entry_id)
+
+    timer = GeweStartupTimer()
+    with timer.measure("shared"):
+        domain_data = _async_setup_shared(hass)
+
+    # 从 config entry 获取配置数据
+    api_url = entry.data[CONF_API_URL]
+    gewe_token = entry.data[CONF_GEWE_TOKEN]
+    app_id = entry.data[CONF_APP_ID]
+
+    # 每个账号独立的连接池，重载时复用
+    with timer.measure("client"):
+        session = domain_data["sessions"].get(entry.entry_id)
+        if session is None:
+            session = domain_data["sessions"][entry.entry_id] = async_create_clientsession(hass)
+        api = GeweAPI(hass, api_url, session)
+    _LOGGER.debug("Instance %s of Gewe Notify regeisted.", api)
+
+    # 接收 Gewe 推送的消息回调
+    if CONF_WEBHOOK_ID not in entry.data:
+        hass.config_entries.async_update_entry(
+            entry, data={**entry.data, CONF_WEBHOOK_ID: secrets.token_hex(16)}
+        )
+    # 服务名、通讯录文件名只在第一次设置时确定，之后不随条目顺序变化
+    async_assign_account_name(hass, entry)
+    receiver = GeweCallbackReceiver(hass, entry)
+    receiver.async_start()
+    domain_data["callback_receivers"][entry.data[CONF_WEBHOOK_ID]] = receiver
+
+    domain_data["entries"][entry.entry_id] = {
+        "entry": entry,
+        "api": api,
+        "login_watcher": GeweLoginWatcher(hass, entry, api),
+        "receiver": receiver,
+        "startup": timer,
+    }
+
+    if not hass.services.has_service(DOMAIN, "login"):
+        with timer.measure("services"):
+            _async_register_services(hass)
+
     # Notify doesn't support config entry setup yet, load with discovery for now
-    await discovery.async_load_platform(
+    hass.async_create_task(discovery.async_load_platform(
         hass,
         Platform.NOTIFY,
         DOMAIN,
         {
-            CONF_NAME: "gewe_notify",
+            CONF_NAME: notify_service_name(hass, entry),
+            "entry_id": entry.entry_id,
             CONF_GEWE_TOKEN: gewe_token,
             CONF_APP_ID: app_id
         },
         entry.data,
-    )
+    ))
     _LOGGER.debug("Notify of Gewe Notify regeisted.")
 
-    await hass.config_entries.async_forward_entry_setups(entry, [
-        platform for platform in PLATFORMS if platform != Platform.NOTIFY
-        ])
+    with timer.measure("platforms"):
+        await hass.config_entries.async_forward_entry_setups(entry, [
+            platform for platform in PLATFORMS if platform != Platform.NOTIFY
+            ])
     _LOGGER.debug("Sensor of Gewe Notify regeisted.")
 
+    # 网络检查与缓存预热在 HA 启动完成后于后台进行，不拖慢启动
+    async def _async_at_started(_hass):
+        entry.async_create_background_task(
+            hass, _async_deferred_startup(hass, entry), f"gewe_notify startup {entry.entry_id}"
+        )
+    entry.async_on_unload(async_at_started(hass, _async_at_started))
+
     _LOGGER.info("Gewe Notify integration setup complete.")
     return True
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
-    _LOGGER.debug("Unloading Gewe Notify integration with entry: %s", entry.as_dict())
+    _LOGGER.debug("Unloading Gewe Notify integration with entry: %s", entry.entry_id)
 
-    #api = hass.data[DOMAIN].get("api")
-    #if api:
-    #    token = entry.data.get(CONF_GEWE_TOKEN)
-    #    app_id = entry.data.get(CONF_APP_ID)
-    #    await api.logout(token, app_id)
-
-    # 取消注册服务
-    hass.services.async_remove(DOMAIN, "fetch_contacts")
-    hass.services.async_remove(DOMAIN, "login")
-    hass.services.async_remove(DOMAIN, "get_qrcode")
+    domain_data = hass.data[DOMAIN]
+    runtime = domain_data["entries"].get(entry.entry_id)
+    if runtime:
+        runtime["login_watcher"].async_cancel()
+        runtime["receiver"].async_stop()
+    domain_data["callback_receivers"].pop(entry.data.get(CONF_WEBHOOK_ID), None)
+    # 快照保留到重载之后，期间的联系人变化不会丢失
+    domain_data["contacts"].async_flush(entry.entry_id)
 
     # 卸载非 NOTIFY 平台
     unload_ok = await hass.config_entries.async_unload_platforms(
          entry, [platform for platform in PLATFORMS if platform != Platform.NOTIFY]
     )
     if unload_ok:
-        hass.data[DOMAIN].pop("api", None)
-        hass.data[DOMAIN].pop("api_view", None)
+        domain_data["entries"].pop(entry.entry_id, None)
+
+    # 最后一个账号卸载时取消注册服务
+    if not domain_data["entries"]:
+        for service in SERVICES:
+            hass.services.async_remove(DOMAIN, service)
+        await domain_data["history"].async_close()
+        domain_data["scheduler"].async_stop()
 
     return unload_ok
 
+def _remove_files(*paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Forget the contacts snapshot and delete the files of a deleted account."""
+    contacts = hass.data.get(DOMAIN, {}).get("contacts")
+    if contacts:
+        contacts.async_forget(entry.entry_id)
+    # 避免之后新增的账号沿用已删除账号的通讯录
+    try:
+        await hass.async_add_executor_job(_remove_files, contacts_file_path(hass, entry.entry_id))
+    except OSError as e:
+        _LOGGER.error(f"Failed to remove files of Gewe account {entry.entry_id}: {e}")
@@ -0,0 +1,104 @@
+import itertools
+import logging
+from homeassistant.core import callback
+from homeassistant.util import slugify
+from .cache import LRUCache
+from .const import CONF_ACCOUNT_NAME, CONF_NICKNAME, CONF_WXID, DOMAIN, ROUTING_AFFINITY, ROUTING_ROUND_ROBIN
+
+_LOGGER = logging.getLogger(__name__)
+
+def loaded_entries(hass):
+    """Return runtime data of every loaded account, keyed by entry_id."""
+    return hass.data.get(DOMAIN, {}).get("entries", {})
+
+def is_legacy_account(entry):
+    """Whether an account uses the legacy names (notify.gewe_notify, gewe_contacts.json)."""
+    return entry.data.get(CONF_ACCOUNT_NAME) == ""
+
+def primary_entry_id(hass):
+    """The account with the legacy names, or the first configured one."""
+    entries = hass.config_entries.async_entries(DOMAIN)
+    for entry in entries:
+        if is_legacy_account(entry):
+            return entry.entry_id
+    return entries[0].entry_id if entries else None
+
+@callback
+def async_assign_account_name(hass, entry):
+    """Choose an account's service name once and store it in entry.data.
+
+    Names must not follow the entry order, otherwise deleting the first
+    account would rename the others and break their automations.
+    """
+    if CONF_ACCOUNT_NAME in entry.data:
+        return
+    others = [other for other in hass.config_entries.async_entries(DOMAIN) if other.entry_id != entry.entry_id]
+    taken = {other.data.get(CONF_ACCOUNT_NAME) for other in others}
+    # 升级前按顺序第一个的账号沿用旧名字
+    if "" not in taken and (not others or hass.config_entries.async_entries(DOMAIN)[0].entry_id == entry.entry_id):
+        name = ""
+    else:
+        name = slugify(entry.data.get(CONF_NICKNAME) or entry.data.get(CONF_WXID) or entry.entry_id)
+        if name in taken:
+            name = f"{name}_{entry.entry_id[:6].lower()}"
+    hass.config_entries.async_update_entry(entry, data={**entry.data, CONF_ACCOUNT_NAME: name})
+
+def notify_service_name(hass, entry):
+    """Return the notify service name of an account."""
+    name = entry.data.get(CONF_ACCOUNT_NAME)
+    return f"{DOMAIN}_{name}" if name else DOMAIN
+
+def contacts_file_path(hass, entry_id=None):
+    """Return the contacts cache file of an account."""
+    entry = hass.config_entries.async_get_entry(entry_id) if entry_id else None
+    if entry_id is None or (entry and is_legacy_account(entry)):
+        return hass.config.path(".storage", "gewe_contacts.json")
+    return hass.config.path(".storage", f"gewe_contacts_{entry_id}.json")
+
+def token_file_path(hass):
+    """Return the credentials cache new accounts start from; accounts keep theirs in entry.data."""
+    return hass.config.path(".storage", "gewe_token.json")
+
+def resolve_account(hass, account=None):
+    """Find a loaded account by entry_id, wxid or nickname; default to the primary one."""
+    entries = loaded_entries(hass)
+    if not entries:
+        return None
+    if not account:
+        return entries.get(primary_entry_id(hass)) or next(iter(entries.values()))
+    for runtime in entries.values():
+        entry = runtime["entry"]
+        if account in (entry.entry_id, entry.data.get(CONF_WXID), entry.data.get(CONF_NICKNAME)):
+            return runtime
+    return None
+
+class GeweAccountRouter:
+    """Spread outbound messages across several WeChat accounts."""
+
+    def __init__(self, hass):
+        self.hass = hass
+        self._counter = itertools.count()
+        # 接收人 -> 上次使用的账号，保证同一接收人尽量由同一账号发送
+        self._affinity = LRUCache(4096)
+
+    def _candidates(self):
+        entries = loaded_entries(self.hass)
+        online = [
+            entry_id for entry_id, runtime in entries.items()
+            if runtime["receiver"].online is not False
+        ]
+        return online or list(entries)
+
+    def select(self, to_wxid, mode=ROUTING_ROUND_ROBIN):
+        """Pick the account (runtime data) that sends to a recipient."""
+        candidates = self._candidates()
+        if not candidates:
+            return None
+        entries = loaded_entries(self.hass)
+        if mode == ROUTING_AFFINITY:
+            entry_id = self._affinity.get(to_wxid)
+            if entry_id not in candidates:
+                entry_id = candidates[next(self._counter) % len(candidates)]
+                self._affinity.set(to_wxid, entry_id)
+            return entries[entry_id]
+        return entries[candidates[next(self._counter) % len(candidates)]]
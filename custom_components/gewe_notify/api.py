@@ -1,35 +1,61 @@
 import aiohttp
 import asyncio
-import logging
 import os
-import base64
-import random
 import aiofiles
 import json
-
-_LOGGER = logging.getLogger(__name__)
+import time
+from .accounts import token_file_path
+from .const import ENDPOINT_CONNECT_TIMEOUT
+from .endpoints import CONNECT_ERRORS, GeweEndpointPool
+from .log import GeweLogger, truncate_dict, truncate_string
+from .messages import MESSAGE_SPECS
+from .qr_code import async_get_qr_store
+
+_LOGGER = GeweLogger(__name__)
+
+def _read_token_file(path):
+    """Blocking read of the saved token file; None when it does not exist."""
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as file:
+        return json.load(file)
+
+async def async_read_saved_token(hass):
+    """Return (token, app_id, wxid) of the cache new accounts start from."""
+    try:
+        token_data = await hass.async_add_executor_job(_read_token_file, token_file_path(hass))
+    except Exception as e:
+        _LOGGER.error("Failed to read token from file", error=e)
+        token_data = None
+    if token_data:
+        return token_data.get("token"), token_data.get("app_id"), token_data.get("wxid")
+    return None, None, None
 
 class GeweAPI:
     """A helper class for handling asynchronous API calls."""
 
     def __init__(self, hass, api_url, session: aiohttp.ClientSession):
-        """Initialize with API URL and aiohttp session."""
-        self.api_url = api_url
+        """Initialize with API URL(s) and aiohttp session."""
+        # api_url 可以是多个后端地址，用逗号或换行分隔
+        self.endpoints = GeweEndpointPool(api_url)
+        self.api_url = self.endpoints.endpoints[0].url
         self.session = session
         self.hass = hass
+        self._timeout = aiohttp.ClientTimeout(total=300, sock_connect=ENDPOINT_CONNECT_TIMEOUT)
+        self._headers_cache = {}
+        self._templates = {}
 
     def truncate_dict(self, d, max_items=10):
         """ 截断字典，只保留前 max_items 个键值对 """
-        truncated = dict(list(d.items())[:max_items])
-        return str(truncated) + ('...' if len(d) > max_items else '')
+        return truncate_dict(d, max_items)
 
     def truncate_string(self, s, max_length=100):
         """ 截断字符串，确保其长度不超过 max_length """
-        return s[:max_length] + ('...' if len(s) > max_length else '') if isinstance(s, str) else str(s)
+        return truncate_string(s, max_length)
 
     async def _handle_offline_error(self, error_message):
         """Trigger a persistent notification prompting reconfiguration."""
-        _LOGGER.error(f"Reconfiguration required: {error_message}")
+        _LOGGER.error("Reconfiguration required", reason=error_message)
         notification_title = "Gewe 集成需要重新扫码登录"
         notification_message = (
             "Gewe 集成检测到你的微信已离线且无法重连. "
@@ -47,221 +73,242 @@ class GeweAPI:
         """Check if the response indicates that the device is offline."""
         return data.get("ret") == 500 and data.get("data", {}).get("code") == "-1"
 
-    async def _api_post(self, url, headers, payload, offline_error_message):
+    async def _post_json(self, path, headers, payload, idempotent=False):
+        """POST to the best backend endpoint and return the decoded JSON body.
+
+        Idempotent reads fail over on any transport error; sends only fail
+        over when the connection could not be made, so nothing is sent twice.
+        """
+        _LOGGER.debug("POST", path=path, payload=payload)
+        last_error = None
+        for endpoint in self.endpoints.ordered(idempotent):
+            start = time.monotonic()
+            try:
+                async with self.session.post(
+                    f"{endpoint.url}{path}", json=payload, headers=headers, timeout=self._timeout
+                ) as response:
+                    data = await response.json(content_type=None)
+            except CONNECT_ERRORS as e:
+                self.endpoints.mark_failure(endpoint, e)
+                last_error = e
+                continue
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                self.endpoints.mark_failure(endpoint, e)
+                last_error = e
+                if idempotent:
+                    continue
+                raise
+            self.endpoints.mark_success(endpoint, time.monotonic() - start)
+            return data
+        raise last_error
+
+    async def _api_post(self, path, headers, payload, offline_error_message, idempotent=False):
         """General method for making POST requests to the API."""
         try:
-            async with self.session.post(url, json=payload, headers=headers) as response:
-                data = await response.json()
-                if self._check_offline_error(data):
-                    await self._handle_offline_error(offline_error_message)
-                    return None
-                if data.get("ret") == 200:
-                    return data.get("data")
-                else:
-                    _LOGGER.error(f"Failed to process request: {data}")
+            data = await self._post_json(path, headers, payload, idempotent)
+            if self._check_offline_error(data):
+                await self._handle_offline_error(offline_error_message)
+                return None
+            if data.get("ret") == 200:
+                return data.get("data")
+            else:
+                # 后端异常时同一接口的错误只抽样记录
+                _LOGGER.error("Failed to process request", sample=path, path=path, response=data)
         except Exception as e:
-            _LOGGER.error(f"Error in API request: {e}")
+            _LOGGER.error("Error in API request", sample=path, path=path, error=e)
         return None
 
     async def get_token(self):
         """Create gewe-token."""
-        url = f"{self.api_url}/v2/api/tools/getTokenId"
-        return await self._api_post(url, {}, {}, "微信已离线，无法获取 token")
+        path = "/v2/api/tools/getTokenId"
+        return await self._api_post(path, {}, {}, "微信已离线，无法获取 token")
 
     async def get_login_qr(self, token, app_id=""):
         """Get login QR code."""
-        url = f"{self.api_url}/v2/api/login/getLoginQrCode"
+        path = "/v2/api/login/getLoginQrCode"
         headers = {"X-GEWE-TOKEN": token, "Content-Type": "application/json"}
         payload = {"appId": app_id}
         try:
-            async with self.session.post(url, json=payload, headers=headers) as response:
-                data = await response.json()
-                if self._check_offline_error(data):
-                    await self._handle_offline_error("微信已离线，无法获取登录二维码")
-                    return None
-                if data["ret"] == 200:
-                    _LOGGER.debug(f"Step 2: Generating QR code for token: {token} app_id: {app_id}")
-                    return data["data"]
-                elif data["ret"] == 500:
-                    _LOGGER.warning("Device not found. Creating new device.")
-                    return await self.get_login_qr(token, "")
-                else:
-                    _LOGGER.error(f"Failed to get QR code: {data}")
+            data = await self._post_json(path, headers, payload)
+            if self._check_offline_error(data):
+                await self._handle_offline_error("微信已离线，无法获取登录二维码")
+                return None
+            if data["ret"] == 200:
+                _LOGGER.debug("Step 2: Generating QR code", token=token, app_id=app_id)
+                return data["data"]
+            elif data["ret"] == 500:
+                _LOGGER.warning("Device not found. Creating new device.")
+                return await self.get_login_qr(token, "")
+            else:
+                _LOGGER.error("Failed to get QR code", response=data)
         except Exception as e:
-            _LOGGER.error(f"Error in get_login_qr: {e}")
+            _LOGGER.error("Error in get_login_qr", error=e)
         return None
 
     async def check_login(self, token, app_id, uuid):
         """Check login status."""
-        url = f"{self.api_url}/v2/api/login/checkLogin"
+        path = "/v2/api/login/checkLogin"
         headers = {"X-GEWE-TOKEN": token, "Content-Type": "application/json"}
         payload = {"appId": app_id, "uuid": uuid}
-        return await self._api_post(url, headers, payload, "微信已离线，无法检查登录状态")
+        return await self._api_post(path, headers, payload, "微信已离线，无法检查登录状态", idempotent=True)
 
     async def check_online(self, token, app_id):
         """Check if the device is online."""
-        url = f"{self.api_url}/v2/api/login/checkOnline"
+        path = "/v2/api/login/checkOnline"
         headers = {"X-GEWE-TOKEN": token, "Content-Type": "application/json"}
         payload = {"appId": app_id}
-        return await self._api_post(url, headers, payload, "微信已离线，无法检查在线状态")
+        return await self._api_post(path, headers, payload, "微信已离线，无法检查在线状态", idempotent=True)
 
     async def logout(self, token, app_id):
         """Logout."""
-        url = f"{self.api_url}/v2/api/login/logout"
+        path = "/v2/api/login/logout"
         headers = {"X-GEWE-TOKEN": token, "Content-Type": "application/json"}
         payload = {"appId": app_id}
         try:
-            async with self.session.post(url, json=payload, headers=headers) as response:
-                data = await response.json()
-                if self._check_offline_error(data):
-                    await self._handle_offline_error("微信已离线，无法登出")
-                    return False
-                if data["ret"] == 200:
-                    return True
-                else:
-                    _LOGGER.error(f"Failed to logout: {data}")
-                    return False
+            data = await self._post_json(path, headers, payload)
+            if self._check_offline_error(data):
+                await self._handle_offline_error("微信已离线，无法登出")
+                return False
+            if data["ret"] == 200:
+                return True
+            else:
+                _LOGGER.error("Failed to logout", response=data)
+                return False
         except Exception as e:
-            _LOGGER.error(f"Error in logout: {e}")
+            _LOGGER.error("Error in logout", error=e)
         return None
 
     async def reconnection(self, token, app_id):
         """Reconnection."""
-        url = f"{self.api_url}/v2/api/login/reconnection"
+        path = "/v2/api/login/reconnection"
         headers = {"X-GEWE-TOKEN": token, "Content-Type": "application/json"}
         payload = {"appId": app_id}
         try:
-            async with self.session.post(url, json=payload, headers=headers) as response:
-                data = await response.json()
-                if self._check_offline_error(data):
-                    await self._handle_offline_error("微信已离线，无法重连")
-                    return False
-                if data["ret"] == 200:
-                    _LOGGER.info(f"Gewe reconnection successful: {data}")
-                    return True
-                else:
-                    _LOGGER.error(f"Failed to reconnection: {data}")
-                    return False
+            data = await self._post_json(path, headers, payload)
+            if self._check_offline_error(data):
+                await self._handle_offline_error("微信已离线，无法重连")
+                return False
+            if data["ret"] == 200:
+                _LOGGER.info("Gewe reconnection successful", response=data)
+                return True
+            else:
+                _LOGGER.error("Failed to reconnection", response=data)
+                return False
         except Exception as e:
-            _LOGGER.error(f"Error in reconnection: {e}")
+            _LOGGER.error("Error in reconnection", error=e)
         return None
 
+    async def set_callback(self, token, callback_url):
+        """Set the URL the Gewe backend pushes messages to."""
+        path = "/v2/api/tools/setCallback"
+        headers = {"X-GEWE-TOKEN": token, "Content-Type": "application/json"}
+        payload = {"token": token, "callbackUrl": callback_url}
+        return await self._api_post(path, headers, payload, "微信已离线，无法设置回调地址")
+
     async def getProfile(self, token, app_id):
         """Get person profile."""
-        url = f"{self.api_url}/v2/api/personal/getProfile"
+        path = "/v2/api/personal/getProfile"
         headers = {"X-GEWE-TOKEN": token, "Content-Type": "application/json"}
         payload = {"appId": app_id}
-        return await self._api_post(url, headers, payload, "微信已离线，无法获取个人资料")
+        return await self._api_post(path, headers, payload, "微信已离线，无法获取个人资料", idempotent=True)
+
+    def _headers(self, token):
+        """Request headers of an account, built once per token."""
+        headers = self._headers_cache.get(token)
+        if headers is None:
+            headers = self._headers_cache[token] = {"X-GEWE-TOKEN": token, "Content-Type": "application/json"}
+        return headers
+
+    def _payload_template(self, app_id):
+        """Payload fields shared by every message of an account, built once per app_id."""
+        template = self._templates.get(app_id)
+        if template is None:
+            template = self._templates[app_id] = {"appId": app_id}
+        return template
+
+    async def send_message(self, token, app_id, to_wxid, message_type="text", **kwargs):
+        """统一的发送消息方法入口，按消息类型查表构建请求"""
+        spec = MESSAGE_SPECS.get(message_type)
+        if spec is None:
+            _LOGGER.error("Unsupported message type", message_type=message_type)
+            raise ValueError(f"Unsupported message type: {message_type}")
+        # 校验失败直接抛出 ValueError，不会发出请求
+        payload = spec.build(self._payload_template(app_id), to_wxid, kwargs)
+        _LOGGER.debug("Sending message", message_type=message_type, to_wxid=to_wxid)
+        return await self._api_post(spec.path, self._headers(token), payload, spec.offline_message)
 
     async def send_text_message(self, token, app_id, to_wxid, content, ats=None):
         """Send a text message."""
-        url = f"{self.api_url}/v2/api/message/postText"
-        headers = {"X-GEWE-TOKEN": token, "Content-Type": "application/json"}
-        # 构建基本的消息 payload
-        payload = {"appId": app_id, "toWxid": to_wxid, "content": content}
-        # 如果有 ats 参数，加入到 payload 中
-        if ats:
-            payload["ats"] = ats
-        _LOGGER.debug(f"Sending text message to {to_wxid} with {content} and ats: {ats}.")
-        return await self._api_post(url, headers, payload, "微信已离线，无法发送文本消息")
+        return await self.send_message(token, app_id, to_wxid, "text", content=content, ats=ats)
 
     async def send_file_message(self, token, app_id, to_wxid, file_url, file_name):
         """Send a file message."""
-        url = f"{self.api_url}/v2/api/message/postFile"
-        headers = {"X-GEWE-TOKEN": token, "Content-Type": "application/json"}
-        payload = {"appId": app_id, "toWxid": to_wxid, "fileUrl": file_url, "fileName": file_name}
-        _LOGGER.debug(f"Sending file message to {to_wxid} with file: {file_name}.")
-        return await self._api_post(url, headers, payload, "微信已离线，无法发送文件消息")
+        return await self.send_message(token, app_id, to_wxid, "file", file_url=file_url, file_name=file_name)
 
     async def send_image_message(self, token, app_id, to_wxid, img_url):
         """Send an image message."""
-        url = f"{self.api_url}/v2/api/message/postImage"
-        headers = {"X-GEWE-TOKEN": token, "Content-Type": "application/json"}
-        payload = {"appId": app_id, "toWxid": to_wxid, "imgUrl": img_url}
-        _LOGGER.debug(f"Sending image message to {to_wxid} with image URL: {img_url}.")
-        return await self._api_post(url, headers, payload, "微信已离线，无法发送图片消息")
+        return await self.send_message(token, app_id, to_wxid, "image", img_url=img_url)
 
     async def send_voice_message(self, token, app_id, to_wxid, voice_url, voice_duration):
         """Send a voice message."""
-        url = f"{self.api_url}/v2/api/message/postVoice"
-        headers = {"X-GEWE-TOKEN": token, "Content-Type": "application/json"}
-        payload = {"appId": app_id, "toWxid": to_wxid, "voiceUrl": voice_url, "voiceDuration": voice_duration}
-        _LOGGER.debug(f"Sending voice message to {to_wxid} with voice URL: {voice_url}.")
-        return await self._api_post(url, headers, payload, "微信已离线，无法发送语音消息")
+        return await self.send_message(
+            token, app_id, to_wxid, "voice", voice_url=voice_url, voice_duration=voice_duration
+        )
 
     async def send_video_message(self, token, app_id, to_wxid, video_url, video_duration, thumb_url):
         """Send a video message."""
-        url = f"{self.api_url}/v2/api/message/postVideo"
-        headers = {"X-GEWE-TOKEN": token, "Content-Type": "application/json"}
-        payload = {"appId": app_id, "toWxid": to_wxid, "videoUrl": video_url, "videoDuration": video_duration, "thumbUrl": thumb_url}
-        _LOGGER.debug(f"Sending video message to {to_wxid} with video URL: {video_url}.")
-        return await self._api_post(url, headers, payload, "微信已离线，无法发送视频消息")
+        return await self.send_message(
+            token, app_id, to_wxid, "video", video_url=video_url, video_duration=video_duration, thumb_url=thumb_url
+        )
 
     async def send_link_message(self, token, app_id, to_wxid, link_url, title, desc, thumb_url):
         """Send a link message."""
-        url = f"{self.api_url}/v2/api/message/postLink"
-        headers = {"X-GEWE-TOKEN": token, "Content-Type": "application/json"}
-        payload = {"appId": app_id, "toWxid": to_wxid, "linkUrl": link_url, "title": title, "desc": desc, "thumbUrl": thumb_url}
-        _LOGGER.debug(f"Sending link message to {to_wxid} with URL: {link_url} and title: {title}.")
-        return await self._api_post(url, headers, payload, "微信已离线，无法发送链接消息")
+        return await self.send_message(
+            token, app_id, to_wxid, "link", link_url=link_url, title=title, desc=desc, thumb_url=thumb_url
+        )
 
-    async def send_message(self, token, app_id, to_wxid, message_type="text", **kwargs):
-        """统一的发送消息方法入口，根据消息类型动态调用相应的方法"""
-        
-        # 判断消息类型，动态调用对应的发送方法
-        if message_type == 'text':
-            content = kwargs.get('content')
-            ats = kwargs.get('ats')  # ats 是可选的，如果没有提供则默认为 None
-            return await self.send_text_message(token, app_id, to_wxid, content, ats)
-        
-        elif message_type == 'file':
-            file_url = kwargs.get('file_url')
-            file_name = kwargs.get('file_name')
-            return await self.send_file_message(token, app_id, to_wxid, file_url, file_name)
-        
-        elif message_type == 'image':
-            img_url = kwargs.get('img_url')
-            return await self.send_image_message(token, app_id, to_wxid, img_url)
-        
-        elif message_type == 'voice':
-            voice_url = kwargs.get('voice_url')
-            voice_duration = kwargs.get('voice_duration')
-            return await self.send_voice_message(token, app_id, to_wxid, voice_url, voice_duration)
-        
-        elif message_type == 'video':
-            video_url = kwargs.get('video_url')
-            video_duration = kwargs.get('video_duration')
-            thumb_url = kwargs.get('thumb_url')
-            return await self.send_video_message(token, app_id, to_wxid, video_url, video_duration, thumb_url)
-        
-        elif message_type == 'link':
-            link_url = kwargs.get('link_url')
-            title = kwargs.get('title')
-            desc = kwargs.get('desc')
-            thumb_url = kwargs.get('thumb_url')
-            return await self.send_link_message(token, app_id, to_wxid, link_url, title, desc, thumb_url)
-        
-        else:
-            _LOGGER.error(f"Unsupported message type: {message_type}")
-            raise ValueError(f"Unsupported message type: {message_type}")
+    async def forward_message(self, token, app_id, to_wxid, message_type, xml, **kwargs):
+        """Forward an already sent message (image, file, video, link or mini_app) by its XML."""
+        return await self.send_message(token, app_id, to_wxid, f"forward_{message_type}", xml=xml, **kwargs)
+
+    async def revoke_message(self, token, app_id, to_wxid, msg_id, new_msg_id, create_time):
+        """Revoke a sent message."""
+        path = "/v2/api/message/revokeMsg"
+        headers = {"X-GEWE-TOKEN": token, "Content-Type": "application/json"}
+        payload = {
+            "appId": app_id,
+            "toWxid": to_wxid,
+            "msgId": str(msg_id),
+            "newMsgId": str(new_msg_id),
+            "createTime": str(create_time),
+        }
+        _LOGGER.debug("Revoking message", new_msg_id=new_msg_id, to_wxid=to_wxid)
+        return await self._api_post(path, headers, payload, "微信已离线，无法撤回消息")
 
     async def fetch_contacts(self, token, app_id):
         """Fetch contact list."""
-        url = f"{self.api_url}/v2/api/contacts/fetchContactsList"
+        path = "/v2/api/contacts/fetchContactsList"
         headers = {"X-GEWE-TOKEN": token, "Content-Type": "application/json"}
         payload = {"appId": app_id}
-        return await self._api_post(url, headers, payload, "微信已离线，获取通讯录失败")
+        return await self._api_post(path, headers, payload, "微信已离线，获取通讯录失败", idempotent=True)
 
     async def fetch_contacts_cache(self, token, app_id):
         """Fetch contact list from cache."""
-        url = f"{self.api_url}/v2/api/contacts/fetchContactsListCache"
+        path = "/v2/api/contacts/fetchContactsListCache"
         headers = {"X-GEWE-TOKEN": token, "Content-Type": "application/json"}
         payload = {"appId": app_id}
-        return await self._api_post(url, headers, payload, "微信已离线，获取通讯录失败")
+        return await self._api_post(path, headers, payload, "微信已离线，获取通讯录失败", idempotent=True)
+
+    async def get_chatroom_member_list(self, token, app_id, chatroom_id):
+        """Fetch the member list of a chatroom."""
+        path = "/v2/api/group/getChatroomMemberList"
+        headers = {"X-GEWE-TOKEN": token, "Content-Type": "application/json"}
+        payload = {"appId": app_id, "chatroomId": chatroom_id}
+        return await self._api_post(path, headers, payload, "微信已离线，获取群成员失败", idempotent=True)
 
     async def fetch_contacts_info(self, token, app_id, wxids):
         """Fetch brief contact information in batches of up to 100 wxids."""
-        url = f"{self.api_url}/v2/api/contacts/getBriefInfo"
+        path = "/v2/api/contacts/getBriefInfo"
         headers = {"X-GEWE-TOKEN": token, "Content-Type": "application/json"}
 
         def chunkify(lst, chunk_size):
@@ -271,7 +318,7 @@ class GeweAPI:
         all_contacts = []
         for wxid_batch in chunkify(wxids, 100):
             payload = {"appId": app_id, "wxids": wxid_batch}
-            data = await self._api_post(url, headers, payload, "微信已离线，获取个人信息失败")
+            data = await self._api_post(path, headers, payload, "微信已离线，获取个人信息失败", idempotent=True)
             if data:
                 all_contacts.extend(data)
         return all_contacts or None
@@ -342,43 +389,27 @@ class GeweAPI:
             "chatrooms": chatrooms_result
         }
 
-    async def save_qr_code_to_file(self, qr_code_base64):
-        """Save QR code image to the www directory and return its URL."""
-        www_path = self.hass.config.path("www")
-        os.makedirs(www_path, exist_ok=True)
-        img_path = os.path.join(www_path, "gewe_qr_code.jpg")
-        random_number = random.randint(1000,9999)
+    def store_qr_code(self, uuid, qr_code_base64):
+        """Keep the QR code image in memory and return a signed URL to it."""
         try:
-            img_data = base64.b64decode(qr_code_base64.split(",", 1)[-1])
-            async with aiofiles.open(img_path, "wb") as file:
-                await file.write(img_data)
-            return f"/local/gewe_qr_code.jpg?v={random_number}"
+            return async_get_qr_store(self.hass).add(uuid, qr_code_base64)
         except Exception as e:
-            _LOGGER.error(f"Failed to save QR code image: {e}")
+            _LOGGER.error("Failed to store QR code image", error=e)
             return None
 
     async def save_token_to_file(self, token, app_id, wxid):
         """Save the token, app_id, and wxid to a file in .storage."""
-        token_file_path = os.path.join(self.hass.config.path(".storage"), "gewe_token.json")
         try:
-            async with aiofiles.open(token_file_path, "w") as file:
+            async with aiofiles.open(token_file_path(self.hass), "w") as file:
                 await file.write(json.dumps({
                     "token": token,
                     "app_id": app_id,
                     "wxid": wxid
                 }))
         except Exception as e:
-            _LOGGER.error(f"Failed to save token to file: {e}")
+            _LOGGER.error("Failed to save token to file", error=e)
 
     async def get_token_from_file(self):
         """Get the token, app_id, and wxid from the file stored in .storage."""
-        token_file_path = os.path.join(self.hass.config.path(".storage"), "gewe_token.json")
-        if os.path.exists(token_file_path):
-            try:
-                async with aiofiles.open(token_file_path, "r") as file:
-                    token_data = json.loads(await file.read())
-                    return token_data.get("token"), token_data.get("app_id"), token_data.get("wxid")
-            except Exception as e:
-                _LOGGER.error(f"Failed to read token from file: {e}")
-        return None, None, None
+        return await async_read_saved_token(self.hass)
  
@@ -0,0 +1,50 @@
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+class LRUCache:
+    """A small in-memory LRU cache with an optional time-to-live."""
+
+    def __init__(self, max_items=128, ttl=None):
+        """Initialize with the maximum number of items and TTL in seconds."""
+        self.max_items = max_items
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def _expired(self, stored_at):
+        return self.ttl is not None and time.monotonic() - stored_at > self.ttl
+
+    def get(self, key, default=None):
+        """Return the cached value and mark it as recently used."""
+        item = self._data.get(key, _MISSING)
+        if item is _MISSING:
+            return default
+        value, stored_at = item
+        if self._expired(stored_at):
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used item when full."""
+        self._data[key] = (value, time.monotonic())
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_items:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """Remove a key and return its value."""
+        item = self._data.pop(key, _MISSING)
+        return default if item is _MISSING else item[0]
+
+    def clear(self):
+        """Drop every cached item."""
+        self._data.clear()
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self._data)
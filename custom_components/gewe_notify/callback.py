@@ -0,0 +1,165 @@
+import asyncio
+import json
+import logging
+from collections import deque
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from .cache import LRUCache
+from .const import (
+    CALLBACK_BACKLOG,
+    CALLBACK_BATCH_SIZE,
+    CALLBACK_DEDUP_SIZE,
+    CONF_APP_ID,
+    DOMAIN,
+    EVENT_MESSAGE_RECEIVED,
+    SIGNAL_ONLINE_STATE,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+# 群系统消息（成员变动等）
+GROUP_SYSTEM_MSG_TYPES = (10000, 10002)
+
+def _string(value):
+    """Gewe wraps most text fields as {"string": ...}; anything but text becomes None."""
+    if isinstance(value, dict):
+        value = value.get("string")
+    return value if isinstance(value, str) else None
+
+def _data(payload):
+    """The Data object of a callback, {} when it is missing or not an object."""
+    data = payload.get("Data")
+    return data if isinstance(data, dict) else {}
+
+def normalize_message(payload):
+    """Flatten a Gewe AddMsg callback into an event payload."""
+    data = _data(payload)
+    from_wxid = _string(data.get("FromUserName"))
+    to_wxid = _string(data.get("ToUserName"))
+    content = _string(data.get("Content")) or ""
+    is_group = bool(from_wxid and from_wxid.endswith("@chatroom"))
+    sender_wxid = from_wxid
+    if is_group and ":\n" in content:
+        # 群消息内容格式为 "发送人wxid:\n内容"
+        sender_wxid, content = content.split(":\n", 1)
+    return {
+        "type_name": payload.get("TypeName"),
+        "app_id": payload.get("Appid"),
+        "wxid": payload.get("Wxid"),
+        "msg_id": data.get("MsgId"),
+        "new_msg_id": data.get("NewMsgId"),
+        "msg_type": data.get("MsgType"),
+        "from_wxid": from_wxid,
+        "to_wxid": to_wxid,
+        "sender_wxid": sender_wxid,
+        "is_group": is_group,
+        "content": content,
+        "push_content": data.get("PushContent"),
+        "create_time": data.get("CreateTime"),
+    }
+
+class GeweCallbackReceiver:
+    """Queue raw Gewe callbacks and turn them into HA events off the request path."""
+
+    def __init__(self, hass, entry):
+        self.hass = hass
+        self.entry = entry
+        self._queue = deque(maxlen=CALLBACK_BACKLOG)
+        self._wakeup = asyncio.Event()
+        self._seen = LRUCache(CALLBACK_DEDUP_SIZE)
+        self._task = None
+        self.dropped = 0
+        self.received = 0
+        self.online = None
+
+    def async_start(self):
+        """Start the background worker."""
+        self._task = self.hass.async_create_background_task(
+            self._async_worker(), f"gewe_notify callback worker {self.entry.entry_id}"
+        )
+
+    def async_stop(self):
+        """Stop the background worker."""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def enqueue(self, body):
+        """Accept a raw callback body. Must be cheap, it runs in the HTTP handler."""
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1
+        self._queue.append(body)
+        self.received += 1
+        self._wakeup.set()
+
+    async def _async_worker(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._queue:
+                for _ in range(min(CALLBACK_BATCH_SIZE, len(self._queue))):
+                    # 单条异常数据不能让后台任务退出
+                    try:
+                        self._process(self._queue.popleft())
+                    except Exception:
+                        _LOGGER.exception("Error processing Gewe callback")
+                # 每批之间让出事件循环
+                await asyncio.sleep(0)
+            if self.dropped:
+                _LOGGER.warning(f"Callback backlog full, {self.dropped} callbacks dropped.")
+                self.dropped = 0
+
+    def set_online(self, online):
+        """Push online state changes to the sensor."""
+        if online != self.online:
+            self.online = online
+            async_dispatcher_send(self.hass, SIGNAL_ONLINE_STATE.format(self.entry.entry_id), online)
+
+    def _contact_changed(self, type_name, data):
+        """Push contact changes to the contacts snapshot (and websocket subscribers)."""
+        contacts = self.hass.data[DOMAIN].get("contacts")
+        wxid = _string(data.get("UserName"))
+        if not contacts or not wxid:
+            return
+        if type_name == "DelContacts":
+            contacts.async_apply(self.entry.entry_id, removed=wxid)
+            return
+        contact = {"userName": wxid}
+        for key, field in (("nickName", "NickName"), ("remark", "Remark"), ("smallHeadImgUrl", "SmallHeadImgUrl")):
+            value = _string(data.get(field))
+            if value is not None:
+                contact[key] = value
+        contacts.async_apply(self.entry.entry_id, contact=contact)
+
+    def _process(self, body):
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            _LOGGER.debug("Ignore malformed callback body.")
+            return
+        if not isinstance(payload, dict) or "TypeName" not in payload:
+            # 设置回调地址时 Gewe 会先推送一条测试消息
+            return
+        app_id = payload.get("Appid")
+        if app_id and app_id != self.entry.data.get(CONF_APP_ID):
+            return
+
+        type_name = payload["TypeName"]
+        self.set_online(type_name != "Offline")
+        if type_name in ("ModContacts", "DelContacts"):
+            self._contact_changed(type_name, _data(payload))
+            return
+        if type_name != "AddMsg" or not isinstance(payload.get("Data"), dict):
+            return
+        message = normalize_message(payload)
+        dedup_key = message["new_msg_id"] or message["msg_id"]
+        if dedup_key is not None:
+            if dedup_key in self._seen:
+                return
+            self._seen.set(dedup_key, True)
+        message["entry_id"] = self.entry.entry_id
+        if message["is_group"] and message["msg_type"] in GROUP_SYSTEM_MSG_TYPES:
+            # 入群/退群等系统消息，群成员缓存失效
+            chatroom_members = self.hass.data[DOMAIN].get("chatroom_members")
+            if chatroom_members:
+                chatroom_members.invalidate(app_id or self.entry.data.get(CONF_APP_ID), message["from_wxid"])
+        self.hass.bus.async_fire(EVENT_MESSAGE_RECEIVED, message)
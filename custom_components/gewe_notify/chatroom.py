@@ -0,0 +1,148 @@
+import asyncio
+import json
+import logging
+import os
+from .accounts import contacts_file_path
+from .cache import LRUCache
+from .const import (
+    CHATROOM_CACHE_SIZE,
+    CHATROOM_MEMBER_TTL,
+    CONF_APP_ID,
+    CONF_GEWE_TOKEN,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+AT_ALL = "notify@all"
+# 微信客户端在 @名字 后使用的分隔符（四分之一全角空格）
+AT_SEPARATOR = "\u2005"
+
+def split_ats(ats):
+    """Accept ats as a list or a comma separated string."""
+    if not ats:
+        return []
+    if isinstance(ats, str):
+        ats = ats.split(",")
+    return [str(item).strip() for item in ats if str(item).strip()]
+
+def _load_remarks(path):
+    """Read wxid -> remark of friends from the contacts file (runs in executor)."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        contacts = json.load(f)
+    return {
+        friend["userName"]: friend["remark"]
+        for friend in contacts.get("friends", [])
+        if friend.get("userName") and friend.get("remark")
+    }
+
+class GeweChatroom:
+    """Members of one chatroom with an in-memory name index."""
+
+    __slots__ = ("names", "index")
+
+    def __init__(self, members, remarks):
+        # wxid -> 群里显示的名字
+        self.names = {}
+        # 小写的 wxid/群昵称/备注/昵称 -> wxid
+        self.index = {}
+        for member in members:
+            wxid = member.get("wxid")
+            if not wxid:
+                continue
+            self.names[wxid] = member.get("displayName") or member.get("nickName") or wxid
+            for key in (wxid, member.get("displayName"), remarks.get(wxid), member.get("nickName")):
+                if key:
+                    self.index.setdefault(key.casefold(), wxid)
+
+    def lookup(self, name):
+        """Return the wxid of a member by wxid, group nickname, remark or nickname."""
+        return self.index.get(name.casefold())
+
+class GeweChatroomMembers:
+    """Lazily loaded, TTL bound cache of chatroom members used to resolve @mentions."""
+
+    def __init__(self, hass):
+        self.hass = hass
+        self._rooms = LRUCache(CHATROOM_CACHE_SIZE, ttl=CHATROOM_MEMBER_TTL)
+        self._remarks = LRUCache(16, ttl=CHATROOM_MEMBER_TTL)
+        self._locks = {}
+
+    def invalidate(self, app_id, chatroom_id):
+        """Forget a room, e.g. after members joined or left."""
+        self._rooms.pop((app_id, chatroom_id))
+
+    def invalidate_remarks(self, entry_id):
+        """Forget cached remarks after the contacts of an account changed."""
+        self._remarks.pop(entry_id)
+
+    async def async_load_remarks(self, entry):
+        """Load friend remarks of an account from its contacts file, once per TTL."""
+        remarks = self._remarks.get(entry.entry_id)
+        if remarks is None:
+            try:
+                remarks = await self.hass.async_add_executor_job(
+                    _load_remarks, contacts_file_path(self.hass, entry.entry_id)
+                )
+            except Exception as e:
+                _LOGGER.debug(f"Failed to read remarks from contacts file: {e}")
+                remarks = {}
+            self._remarks.set(entry.entry_id, remarks)
+        return remarks
+
+    async def async_get(self, runtime, chatroom_id):
+        """Return the members of a chatroom, fetching them at most once per TTL."""
+        entry = runtime["entry"]
+        app_id = entry.data.get(CONF_APP_ID)
+        key = (app_id, chatroom_id)
+        room = self._rooms.get(key)
+        if room is not None:
+            return room
+        # 同一个群并发请求只拉取一次
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            room = self._rooms.get(key)
+            if room is not None:
+                return room
+            data = await runtime["api"].get_chatroom_member_list(
+                entry.data.get(CONF_GEWE_TOKEN), app_id, chatroom_id
+            )
+            if data:
+                room = GeweChatroom(data.get("memberList") or [], await self.async_load_remarks(entry))
+                self._rooms.set(key, room)
+                _LOGGER.debug("Cached %d members of %s", len(room.names), chatroom_id)
+        self._locks.pop(key, None)
+        return room
+
+    async def async_resolve(self, runtime, chatroom_id, ats):
+        """Resolve names/remarks/"all" in ats to wxids.
+
+        Returns the ats string for the API and the "@name" prefix to put in
+        front of the message content.
+        """
+        items = split_ats(ats)
+        if not items:
+            return None, ""
+        wxids, names = [], []
+        room = None
+        loaded = False
+        for item in items:
+            if item.casefold() in ("all", AT_ALL):
+                if AT_ALL not in wxids:
+                    wxids.append(AT_ALL)
+                    names.append("所有人")
+                continue
+            if not loaded:
+                room = await self.async_get(runtime, chatroom_id)
+                loaded = True
+            wxid = room.lookup(item) if room else None
+            if wxid is None:
+                # 找不到时按原样当作 wxid 传给接口，兼容旧用法
+                _LOGGER.warning(f"Cannot find member {item} in {chatroom_id}")
+                wxid = item
+            if wxid not in wxids:
+                wxids.append(wxid)
+                names.append(room.names.get(wxid, item) if room else item)
+        prefix = "".join(f"@{name}{AT_SEPARATOR}" for name in names)
+        return ",".join(wxids), prefix
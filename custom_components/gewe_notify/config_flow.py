@@ -1,16 +1,33 @@
+import asyncio
 import logging
 import voluptuous as vol
 from homeassistant import config_entries
 from homeassistant.core import callback
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
 from homeassistant.helpers.entity_registry import async_get as get_entity_registry
-from .api import GeweAPI
+from .api import GeweAPI, async_read_saved_token
+from .accounts import loaded_entries
+from .qr_code import async_get_qr_store
+from .endpoints import parse_api_urls
+from .log import redact
 from .const import CONF_API_URL, DOMAIN, CONF_GEWE_TOKEN, CONF_APP_ID, CONF_WXID, CONF_NICKNAME
 
 _LOGGER = logging.getLogger(__name__)
 
 USER_INPUT_SCHEMA = vol.Schema({vol.Required(CONF_API_URL): str})
 
+def _async_get_flow_api(hass, api_url, entry_id=None):
+    """Reuse the running integration's GeweAPI for the same backend, otherwise build one."""
+    runtime = loaded_entries(hass).get(entry_id)
+    candidates = [runtime] if runtime else []
+    candidates += loaded_entries(hass).values()
+    wanted = parse_api_urls(api_url)
+    for runtime in candidates:
+        api = runtime["api"]
+        if [endpoint.url for endpoint in api.endpoints.endpoints] == wanted:
+            return api
+    return GeweAPI(hass, api_url, async_get_clientsession(hass))
+
 class GeweConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     """Handle a config flow for Gewe Notify."""
 
@@ -28,6 +45,26 @@ class GeweConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         self.relogin_flag = False
         self.scaned_flag = False
         self.reconfigure_flag = False
+        self._token_task = None
+        # 同一个流程内的检查结果缓存，重新提交表单时不再重复请求
+        self._checks = {}
+
+    async def _async_cached_check(self, name, func, *args):
+        """Run a backend check once per flow; only successful results are cached."""
+        key = (name, self.api_url, *args)
+        if key not in self._checks:
+            result = await func(*args)
+            if result is None:
+                return None
+            self._checks[key] = result
+        return self._checks[key]
+
+    async def _async_saved_token(self):
+        """Read the saved token, using the read started when the form was shown."""
+        if self._token_task is None:
+            return await async_read_saved_token(self.hass)
+        task, self._token_task = self._token_task, None
+        return await task
 
     async def async_step_user(self, user_input=None):
         """Handle the initial step where the user inputs the API URL."""
@@ -38,29 +75,41 @@ class GeweConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         # 动态创建数据 Schema，填充默认值
         data_schema = vol.Schema({vol.Required(CONF_API_URL, default=default_api_url): str})
 
+        if user_input is None and not self.token and self._token_task is None:
+            # 用户填写地址时就在后台读取保存的 token
+            self._token_task = self.hass.async_create_task(async_read_saved_token(self.hass))
+
         # 保存输入的 user_input，避免重新输入
         if user_input is not None:
-            self.api_url = user_input[CONF_API_URL]
+            # 可填写多个后端地址，统一整理成逗号分隔
+            api_urls = parse_api_urls(user_input[CONF_API_URL])
+            if not api_urls:
+                errors["base"] = "invalid_api_url"
+                return self.async_show_form(step_id="user", data_schema=data_schema, errors=errors)
+            self.api_url = ", ".join(api_urls)
         else:
             # 如果没有 user_input，则展示表单
             return self.async_show_form(step_id="user", data_schema=data_schema, errors=errors)
 
-        if not self.api:
-            session = async_get_clientsession(self.hass)
-            self.api = GeweAPI(self.hass, self.api_url, session)
+        if not self.api or [endpoint.url for endpoint in self.api.endpoints.endpoints] != api_urls:
+            self.api = _async_get_flow_api(self.hass, self.api_url, self.context.get("entry_id"))
 
         # 如果之前已读取 token，不再重复读取
         if not self.token:
-            self.token, self.app_id, self.wxid = await self.api.get_token_from_file()
+            self.token, self.app_id, self.wxid = await self._async_saved_token()
+            # 已被其他配置使用的设备不能复用，添加新账号时重新创建设备
+            if self.app_id in {entry.data.get(CONF_APP_ID) for entry in self._async_current_entries()}:
+                self.app_id = None
+                self.wxid = None
             # Step 1: 获取 token
             if not self.token:
                 self.token = await self.api.get_token()
                 if not self.token:
                     errors["base"] = "token_fetch_failed"
                 else:
-                    _LOGGER.debug(f"Get token: {self.token}")
+                    _LOGGER.debug("Get token: %s", redact(self.token))
             else:
-                _LOGGER.debug(f"Step 1: Get token from storage: **Token: {self.token}** **App Id: {self.app_id}** **Wxid: {self.wxid}**")
+                _LOGGER.debug("Step 1: Get token from storage: token=%s app_id=%s wxid=%s", redact(self.token), redact(self.app_id), self.wxid)
 
         if not errors:
             # Step 2: 检查 QR Code 或登录状态
@@ -71,26 +120,33 @@ class GeweConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                     self.uuid = qr_data["uuid"]
                     qr_code_base64 = qr_data["qrImgBase64"]
 
-                    # 保存 QR Code
-                    self.qr_image_url = await self.api.save_qr_code_to_file(qr_code_base64)
+                    # 缓存 QR Code
+                    self.qr_image_url = self.api.store_qr_code(self.uuid, qr_code_base64)
                     if self.qr_image_url:
-                        _LOGGER.debug(f"QR Code saved and accessible at: {self.qr_image_url}")
+                        _LOGGER.debug(f"QR Code accessible at: {self.qr_image_url}")
                         return await self.async_step_confirm()
                     else:
                         errors["base"] = "qr_code_save_failed"
-                        _LOGGER.debug("QR code save failed.")
+                        _LOGGER.debug("QR code store failed.")
                 else:
                     errors["base"] = "qr_code_fetch_failed"
                     _LOGGER.debug("QR code fetch failed.")
             else:
-                # 检查在线状态
-                check_online = await self.api.check_online(self.token, self.app_id)
+                # 在线状态和个人资料互不依赖，并发请求；没有设备时直接扫码
+                check_online, profile = None, None
+                if self.app_id:
+                    check_online, profile = await asyncio.gather(
+                        self._async_cached_check("check_online", self.api.check_online, self.token, self.app_id),
+                        self._async_cached_check("profile", self.api.getProfile, self.token, self.app_id),
+                    )
                 if check_online:
-                    profile = await self.api.getProfile(self.token, self.app_id)
                     if profile:
                         nickname = profile["nickName"]
+                        self.wxid = self.wxid or profile.get("wxid")
+                        await self.async_set_unique_id(self.wxid)
+                        self._abort_if_unique_id_configured()
                         return self.async_create_entry(
-                            title="Gewe Notify",
+                            title=f"Gewe Notify {nickname}",
                             data={
                                 CONF_API_URL: self.api_url,
                                 CONF_GEWE_TOKEN: self.token,
@@ -113,7 +169,10 @@ class GeweConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
     async def async_step_confirm(self, user_input=None):
         """Handle the step where the user confirms the QR code scan."""
-        _LOGGER.debug(f"Start confirm: API URL {self.api_url} Token: {self.token} App Id: {self.app_id} User Input: {user_input} relogin_flag {self.relogin_flag} scaned_flag: {self.scaned_flag}")
+        _LOGGER.debug(
+            "Start confirm: api_url=%s token=%s app_id=%s relogin_flag=%s scaned_flag=%s",
+            self.api_url, redact(self.token), redact(self.app_id), self.relogin_flag, self.scaned_flag,
+        )
 
         errors = {}
 
@@ -123,12 +182,14 @@ class GeweConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             if login_data.get("loginInfo") and login_data["loginInfo"].get("wxid"):
                 nickname = login_data["nickName"]
                 self.wxid = login_data["loginInfo"]["wxid"]
-                await self.api.save_token_to_file(self.token, self.app_id, self.wxid)
+                async_get_qr_store(self.hass).remove(self.uuid)
                 if self.relogin_flag and self.reconfigure_flag:
                     # Update the existing config entry
                     current_entry = self.hass.config_entries.async_get_entry(self.context["entry_id"])
                     if current_entry:
                         updated_data = {
+                            # 保留回调地址、账号名等其他字段
+                            **current_entry.data,
                             CONF_API_URL: self.api_url,
                             CONF_GEWE_TOKEN: self.token,
                             CONF_APP_ID: self.app_id,
@@ -139,10 +200,14 @@ class GeweConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                         self.hass.config_entries.async_update_entry(current_entry, data=updated_data)
                         return self.async_abort(reason="reconfigured_successfully")
                 else:
+                    # 已有账号的凭据只保存在条目中，文件只给之后新增的账号使用
+                    await self.api.save_token_to_file(self.token, self.app_id, self.wxid)
                     # Create config entry
                     _LOGGER.debug("Create new entry!!")
+                    await self.async_set_unique_id(self.wxid)
+                    self._abort_if_unique_id_configured()
                     return self.async_create_entry(
-                        title="Gewe Notify",
+                        title=f"Gewe Notify {nickname}",
                         data={
                             CONF_API_URL: self.api_url,
                             CONF_GEWE_TOKEN: self.token,
@@ -183,8 +248,7 @@ class GeweConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             return self.async_abort(reason="config_entry_not_found")
 
         if not self.api:
-            session = async_get_clientsession(self.hass)
-            self.api = GeweAPI(self.hass, self.api_url, session)
+            self.api = _async_get_flow_api(self.hass, self.api_url, current_entry.entry_id)
 
         try:
             # Logout the user
@@ -240,8 +304,7 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
         errors = {}
 
         if not self.api:
-            session = async_get_clientsession(self.hass)
-            self.api = GeweAPI(self.hass, self.api_url, session)
+            self.api = _async_get_flow_api(self.hass, self.api_url, self.config_entry.entry_id)
 
         if not self.option_flag:
             try:
@@ -261,10 +324,10 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
                 self.uuid = qr_data["uuid"]
                 qr_code_base64 = qr_data["qrImgBase64"]
 
-                # 保存 QR Code
-                self.qr_image_url = await self.api.save_qr_code_to_file(qr_code_base64)
+                # 缓存 QR Code
+                self.qr_image_url = self.api.store_qr_code(self.uuid, qr_code_base64)
                 if self.qr_image_url:
-                    _LOGGER.debug(f"QR Code saved and accessible at: {self.qr_image_url}")
+                    _LOGGER.debug(f"QR Code accessible at: {self.qr_image_url}")
                     #return await self.async_step_confirm()
                     self.scaned_flag = True
                     return self.async_show_form(
@@ -275,7 +338,7 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
                     )
                 else:
                     errors["base"] = "qr_code_save_failed"
-                    _LOGGER.debug("QR code save failed.")
+                    _LOGGER.debug("QR code store failed.")
             else:
                 errors["base"] = "qr_code_fetch_failed"
                 _LOGGER.debug("QR code fetch failed.")
@@ -285,8 +348,12 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
             if login_data.get("loginInfo") and login_data["loginInfo"].get("wxid"):
                 nickname = login_data["nickName"]
                 self.wxid = login_data["loginInfo"]["wxid"]
-                await self.api.save_token_to_file(self.token, self.app_id, self.wxid)
-                # 更新配置后，重新加载集成
+                async_get_qr_store(self.hass).remove(self.uuid)
+                # 扫码时可能换了新设备，保存新的 app_id 后重新加载集成
+                self.hass.config_entries.async_update_entry(
+                    self.config_entry,
+                    data={**self.config_entry.data, CONF_APP_ID: self.app_id, CONF_WXID: self.wxid, CONF_NICKNAME: nickname},
+                )
                 await self.hass.config_entries.async_reload(self.config_entry.entry_id)
                 _LOGGER.debug("Update entry (options)!!")
                 return self.async_abort(reason="options_successfully")
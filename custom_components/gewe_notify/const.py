@@ -3,5 +3,98 @@ CONF_GEWE_TOKEN = "gewe_token"
 CONF_APP_ID = "app_id"
 CONF_WXID = "wxid"
 CONF_NICKNAME = "nickname"
+# 账号名，用于 notify 服务名；空字符串表示沿用旧名字
+CONF_ACCOUNT_NAME = "account_name"
 DOMAIN = "gewe_notify"
 
+
+# 媒体缓存 / 图片压缩
+MEDIA_VIEW_URL = "/api/gewe_notify/media/{name}"
+MEDIA_CACHE_SIZE = 32
+MEDIA_DOWNLOAD_LIMIT = 25 * 1024 * 1024
+DEFAULT_IMAGE_MAX_SIZE = 1920
+DEFAULT_IMAGE_QUALITY = 80
+DEFAULT_IMAGE_FORMAT = "jpeg"
+
+# 媒体转发缓存
+FORWARD_CACHE_KEY = "gewe_notify_forward_cache"
+FORWARD_CACHE_MAX_ITEMS = 500
+FORWARD_HASH_TTL = 300
+
+# 语音/视频元数据探测
+PROBE_CACHE_SIZE = 256
+PROBE_CACHE_TTL = 6 * 3600
+PROBE_HEAD_SIZE = 64 * 1024
+PROBE_MAX_VOICE_SIZE = 2 * 1024 * 1024
+
+# 链接预览
+LINK_PREVIEW_CACHE_SIZE = 128
+LINK_PREVIEW_CACHE_TTL = 3600
+LINK_PREVIEW_MAX_BYTES = 256 * 1024
+
+# 长文本分段，单条文本消息的最大 UTF-8 字节数
+TEXT_MAX_BYTES = 4000
+# 单段下限，需要明显大于分段序号预留的字节数
+TEXT_MIN_BYTES = 64
+
+# 后台扫码登录
+EVENT_LOGIN_STATUS = "gewe_notify_login_status"
+LOGIN_TIMEOUT = 300
+LOGIN_MAX_ERRORS = 5
+# (截止秒数, 轮询间隔秒数)
+LOGIN_POLL_SCHEDULE = [(30, 1), (90, 2), (LOGIN_TIMEOUT, 5)]
+
+# 登录二维码
+QR_CODE_VIEW_URL = "/api/gewe_notify/qrcode/{uuid}"
+QR_CODE_TTL = LOGIN_TIMEOUT
+
+# 消息回调
+CONF_WEBHOOK_ID = "webhook_id"
+CALLBACK_VIEW_URL = "/api/gewe_notify/callback/{webhook_id}"
+CALLBACK_BACKLOG = 2000
+CALLBACK_BATCH_SIZE = 50
+CALLBACK_DEDUP_SIZE = 4096
+EVENT_MESSAGE_RECEIVED = "gewe_notify_message_received"
+SIGNAL_ONLINE_STATE = "gewe_notify_online_state_{}"
+
+# 发送历史
+HISTORY_FLUSH_DELAY = 5
+HISTORY_MAX_AGE = 30 * 86400
+HISTORY_MAX_ROWS = 50000
+HISTORY_CONTENT_LENGTH = 500
+
+# 多账号分流
+ROUTING_ROUND_ROBIN = "round_robin"
+ROUTING_AFFINITY = "affinity"
+
+# 多后端健康检查与故障切换
+ENDPOINT_FAILURE_THRESHOLD = 3
+ENDPOINT_COOLDOWN = 30
+ENDPOINT_MAX_COOLDOWN = 300
+ENDPOINT_LATENCY_ALPHA = 0.3
+ENDPOINT_NOTIFY_INTERVAL = 60
+ENDPOINT_CONNECT_TIMEOUT = 5
+
+# 群成员缓存（@ 提及）
+CHATROOM_CACHE_SIZE = 64
+CHATROOM_MEMBER_TTL = 6 * 3600
+
+# 通讯录快照与 websocket 推送
+CONTACTS_SAVE_DELAY = 10
+SIGNAL_CONTACTS_UPDATED = "gewe_notify_contacts_updated_{}"
+SIGNAL_MESSAGE_STATUS = "gewe_notify_message_status"
+WS_HISTORY_LIMIT = 50
+
+# 定时/延迟发送
+SCHEDULE_STORAGE_KEY = "gewe_notify_schedule"
+# 重启后超过该时间（秒）仍未发出的定时消息直接丢弃
+SCHEDULE_MAX_LATENESS = 24 * 3600
+
+# 按接收人渲染的消息模板
+TEMPLATE_CACHE_SIZE = 128
+
+# 日志：截断长度与重复错误采样
+LOG_MAX_LENGTH = 100
+LOG_MAX_ITEMS = 10
+LOG_SAMPLE_WINDOW = 60
+LOG_SAMPLE_BURST = 3
@@ -0,0 +1,170 @@
+import json
+import logging
+import os
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.event import async_call_later
+from .accounts import contacts_file_path
+from .const import CONTACTS_SAVE_DELAY, DOMAIN, SIGNAL_CONTACTS_UPDATED
+
+_LOGGER = logging.getLogger(__name__)
+
+CONTACT_KINDS = ("friends", "chatrooms")
+
+def contact_kind(wxid):
+    return "chatrooms" if wxid.endswith("@chatroom") else "friends"
+
+def save_contacts_to_file(file_path, contacts):
+    """Saves contacts data to a file. Blocking, run it in the executor."""
+    try:
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(contacts, f, ensure_ascii=False, indent=4)
+        _LOGGER.info(f"Contacts data saved to {file_path}")
+    except Exception as e:
+        _LOGGER.error(f"Error saving contacts to file: {e}")
+
+def _load_contacts_file(file_path):
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _to_snapshot(contacts):
+    """{"friends": [...], ...} -> {"friends": {userName: contact}, ...}"""
+    return {
+        kind: {contact["userName"]: contact for contact in (contacts or {}).get(kind, []) if contact.get("userName")}
+        for kind in CONTACT_KINDS
+    }
+
+def _to_file(snapshot):
+    return {
+        kind: sorted(snapshot[kind].values(), key=lambda x: x.get("quanPin") or "")
+        for kind in CONTACT_KINDS
+    }
+
+def diff_snapshots(old, new):
+    """Per kind lists of added/updated contacts and removed userNames; empty kinds omitted."""
+    diff = {}
+    for kind in CONTACT_KINDS:
+        before, after = old.get(kind, {}), new.get(kind, {})
+        changes = {
+            "added": [contact for wxid, contact in after.items() if wxid not in before],
+            "updated": [contact for wxid, contact in after.items() if wxid in before and before[wxid] != contact],
+            "removed": [wxid for wxid in before if wxid not in after],
+        }
+        if any(changes.values()):
+            diff[kind] = changes
+    return diff
+
+class GeweContacts:
+    """In-memory contact snapshots per account that push diffs to subscribers."""
+
+    def __init__(self, hass):
+        self.hass = hass
+        self._snapshots = {}
+        self._save_unsubs = {}
+        # 快照加载期间收到的变化，加载后按顺序应用
+        self._pending = {}
+
+    async def async_get(self, entry_id):
+        """Return the snapshot of an account, loading the contacts file once."""
+        snapshot = self._snapshots.get(entry_id)
+        if snapshot is None:
+            try:
+                contacts = await self.hass.async_add_executor_job(
+                    _load_contacts_file, contacts_file_path(self.hass, entry_id)
+                )
+            except Exception as e:
+                _LOGGER.error(f"Error loading contacts: {e}")
+                contacts = None
+            # 加载期间可能已有更新
+            snapshot = self._snapshots.setdefault(entry_id, _to_snapshot(contacts))
+        return snapshot
+
+    async def async_replace(self, entry_id, contacts):
+        """Store a freshly fetched contact list, save it and publish the diff."""
+        old = await self.async_get(entry_id)
+        new = _to_snapshot(contacts)
+        self._snapshots[entry_id] = new
+        await self.hass.async_add_executor_job(
+            save_contacts_to_file, contacts_file_path(self.hass, entry_id), contacts
+        )
+        self._publish(entry_id, diff_snapshots(old, new))
+
+    @callback
+    def async_apply(self, entry_id, contact=None, removed=None):
+        """Apply a single change pushed by the Gewe callback, loading the snapshot first if needed."""
+        snapshot = self._snapshots.get(entry_id)
+        if snapshot is not None:
+            self._apply(entry_id, snapshot, contact, removed)
+            return
+        # 重载后快照已释放：先从文件加载，订阅者和通讯录文件都不会漏掉这次变化
+        pending = self._pending.get(entry_id)
+        if pending is not None:
+            pending.append((contact, removed))
+            return
+        self._pending[entry_id] = [(contact, removed)]
+        self.hass.async_create_task(self._async_load_and_apply(entry_id))
+
+    async def _async_load_and_apply(self, entry_id):
+        snapshot = await self.async_get(entry_id)
+        pending = self._pending.pop(entry_id, [])
+        if not any(snapshot.values()):
+            # 还没有获取过通讯录，只有部分联系人时不写文件
+            return
+        for contact, removed in pending:
+            self._apply(entry_id, snapshot, contact, removed)
+
+    def _apply(self, entry_id, snapshot, contact, removed):
+        old = {kind: dict(snapshot[kind]) for kind in CONTACT_KINDS}
+        if contact:
+            kind = contact_kind(contact["userName"])
+            snapshot[kind][contact["userName"]] = {**snapshot[kind].get(contact["userName"], {}), **contact}
+        if removed:
+            snapshot[contact_kind(removed)].pop(removed, None)
+        diff = diff_snapshots(old, snapshot)
+        if diff:
+            self._publish(entry_id, diff)
+            self._schedule_save(entry_id)
+
+    def _publish(self, entry_id, diff):
+        if not diff:
+            return
+        # 备注可能有变化，@ 解析用的缓存需要刷新
+        chatroom_members = self.hass.data[DOMAIN].get("chatroom_members")
+        if chatroom_members:
+            chatroom_members.invalidate_remarks(entry_id)
+        async_dispatcher_send(self.hass, SIGNAL_CONTACTS_UPDATED.format(entry_id), diff)
+
+    def _schedule_save(self, entry_id):
+        if entry_id in self._save_unsubs:
+            return
+
+        @callback
+        def _save(_now):
+            self._save_unsubs.pop(entry_id, None)
+            snapshot = self._snapshots.get(entry_id)
+            if snapshot is not None:
+                self.hass.async_add_executor_job(
+                    save_contacts_to_file, contacts_file_path(self.hass, entry_id), _to_file(snapshot)
+                )
+
+        self._save_unsubs[entry_id] = async_call_later(self.hass, CONTACTS_SAVE_DELAY, _save)
+
+    def async_flush(self, entry_id):
+        """Save pending changes of an unloaded account; the snapshot is kept for the reload."""
+        unsub = self._save_unsubs.pop(entry_id, None)
+        if unsub:
+            unsub()
+            self.hass.async_add_executor_job(
+                save_contacts_to_file, contacts_file_path(self.hass, entry_id), _to_file(self._snapshots[entry_id])
+            )
+
+    def async_forget(self, entry_id):
+        """Drop everything of a removed account."""
+        unsub = self._save_unsubs.pop(entry_id, None)
+        if unsub:
+            unsub()
+        self._snapshots.pop(entry_id, None)
+        self._pending.pop(entry_id, None)
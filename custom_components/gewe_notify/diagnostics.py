@@ -0,0 +1,24 @@
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+from .const import CONF_APP_ID, CONF_GEWE_TOKEN, CONF_WEBHOOK_ID, CONF_WXID, DOMAIN
+
+TO_REDACT = {CONF_GEWE_TOKEN, CONF_APP_ID, CONF_WEBHOOK_ID, CONF_WXID}
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict:
+    """Return diagnostics for a config entry."""
+    runtime = hass.data.get(DOMAIN, {}).get("entries", {}).get(entry.entry_id)
+    diagnostics = {"entry": async_redact_data(entry.as_dict(), TO_REDACT)}
+    if runtime is None:
+        return diagnostics
+    receiver = runtime["receiver"]
+    diagnostics.update({
+        "startup": runtime["startup"].as_dict(),
+        "endpoints": [endpoint.as_dict() for endpoint in runtime["api"].endpoints.endpoints],
+        "callback": {
+            "online": receiver.online,
+            "received": receiver.received,
+            "backlog": len(receiver._queue),
+        },
+    })
+    return diagnostics
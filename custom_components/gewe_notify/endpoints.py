@@ -0,0 +1,138 @@
+import logging
+import re
+import time
+import aiohttp
+from .const import (
+    ENDPOINT_COOLDOWN,
+    ENDPOINT_FAILURE_THRESHOLD,
+    ENDPOINT_LATENCY_ALPHA,
+    ENDPOINT_MAX_COOLDOWN,
+    ENDPOINT_NOTIFY_INTERVAL,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+STATE_HEALTHY = "healthy"
+STATE_DEGRADED = "degraded"
+STATE_DOWN = "down"
+
+# 请求还没有发出去的连接错误，发送类接口可以安全地切换到下一个后端
+CONNECT_ERRORS = (aiohttp.ClientConnectorError,)
+if hasattr(aiohttp, "ConnectionTimeoutError"):
+    CONNECT_ERRORS += (aiohttp.ConnectionTimeoutError,)
+
+def parse_api_urls(value):
+    """Split the configured API URL field into a list of backend base URLs."""
+    if isinstance(value, (list, tuple)):
+        urls = value
+    else:
+        urls = re.split(r"[\s,;]+", value or "")
+    result = []
+    for url in urls:
+        url = url.strip().rstrip("/")
+        if url and url not in result:
+            result.append(url)
+    return result
+
+class GeweEndpoint:
+    """Health of one Gewe backend, tracked from the requests sent to it."""
+
+    def __init__(self, url):
+        self.url = url
+        self.latency = None
+        self.failures = 0
+        self.requests = 0
+        self.errors = 0
+        self.last_error = None
+        self.last_success = None
+        self._down_until = 0
+        self._cooldown = ENDPOINT_COOLDOWN
+
+    @property
+    def state(self):
+        if self.failures >= ENDPOINT_FAILURE_THRESHOLD:
+            return STATE_DOWN
+        if self.failures:
+            return STATE_DEGRADED
+        return STATE_HEALTHY
+
+    @property
+    def available(self):
+        """Down endpoints get one trial request again after their cooldown."""
+        return self.state != STATE_DOWN or time.monotonic() >= self._down_until
+
+    def as_dict(self):
+        return {
+            "url": self.url,
+            "state": self.state,
+            "latency_ms": round(self.latency * 1000) if self.latency is not None else None,
+            "consecutive_failures": self.failures,
+            "requests": self.requests,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "last_success": self.last_success,
+        }
+
+class GeweEndpointPool:
+    """Pick backend endpoints by health and latency, and report state changes."""
+
+    def __init__(self, urls):
+        self.endpoints = [GeweEndpoint(url) for url in parse_api_urls(urls)]
+        if not self.endpoints:
+            raise ValueError("No Gewe API URL configured")
+        self._listeners = []
+        self._last_notify = 0
+
+    def async_add_listener(self, listener):
+        """Call listener() when an endpoint changes; returns an unsubscribe function."""
+        self._listeners.append(listener)
+        return lambda: self._listeners.remove(listener)
+
+    def _notify(self, changed):
+        now = time.monotonic()
+        # 状态变化立即通知，延迟数据最多每分钟刷新一次
+        if not changed and now - self._last_notify < ENDPOINT_NOTIFY_INTERVAL:
+            return
+        self._last_notify = now
+        for listener in list(self._listeners):
+            listener()
+
+    def ordered(self, idempotent=False):
+        """Endpoints in the order they should be tried.
+
+        Reads go to the fastest healthy endpoint; sends stick to the configured
+        order and only move on when an endpoint is unhealthy.
+        """
+        if idempotent:
+            key = lambda item: (not item[1].available, item[1].state != STATE_HEALTHY, item[1].latency or 0, item[0])
+        else:
+            key = lambda item: (not item[1].available, item[1].state != STATE_HEALTHY, item[0])
+        return [endpoint for _, endpoint in sorted(enumerate(self.endpoints), key=key)]
+
+    def mark_success(self, endpoint, latency):
+        changed = endpoint.state != STATE_HEALTHY
+        endpoint.requests += 1
+        if endpoint.latency is None:
+            endpoint.latency = latency
+        else:
+            endpoint.latency += ENDPOINT_LATENCY_ALPHA * (latency - endpoint.latency)
+        endpoint.failures = 0
+        endpoint.last_success = time.time()
+        endpoint._cooldown = ENDPOINT_COOLDOWN
+        if changed:
+            _LOGGER.info(f"Gewe endpoint {endpoint.url} recovered.")
+        self._notify(changed)
+
+    def mark_failure(self, endpoint, error):
+        old_state = endpoint.state
+        endpoint.requests += 1
+        endpoint.errors += 1
+        endpoint.failures += 1
+        endpoint.last_error = f"{type(error).__name__}: {error}"
+        if endpoint.state == STATE_DOWN:
+            endpoint._down_until = time.monotonic() + endpoint._cooldown
+            # 连续失败时冷却时间翻倍
+            endpoint._cooldown = min(endpoint._cooldown * 2, ENDPOINT_MAX_COOLDOWN)
+            if old_state != STATE_DOWN:
+                _LOGGER.warning(f"Gewe endpoint {endpoint.url} is down: {endpoint.last_error}")
+        self._notify(endpoint.state != old_state)
@@ -0,0 +1,154 @@
+import logging
+import sqlite3
+import threading
+import time
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_call_later
+from .messages import MESSAGE_SPECS
+from .const import (
+    HISTORY_CONTENT_LENGTH,
+    HISTORY_FLUSH_DELAY,
+    HISTORY_MAX_AGE,
+    HISTORY_MAX_ROWS,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    entry_id TEXT,
+    to_wxid TEXT NOT NULL,
+    message_type TEXT NOT NULL,
+    content TEXT,
+    msg_id INTEGER,
+    new_msg_id INTEGER,
+    create_time INTEGER,
+    sent_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_to_wxid ON messages (to_wxid, sent_at);
+CREATE INDEX IF NOT EXISTS idx_messages_sent_at ON messages (sent_at);
+CREATE INDEX IF NOT EXISTS idx_messages_new_msg_id ON messages (new_msg_id);
+CREATE INDEX IF NOT EXISTS idx_messages_msg_id ON messages (msg_id);
+"""
+
+_COLUMNS = ("id", "entry_id", "to_wxid", "message_type", "content", "msg_id", "new_msg_id", "create_time", "sent_at")
+
+
+class GeweMessageHistory:
+    """Bounded, indexed history of sent messages stored in SQLite under .storage."""
+
+    def __init__(self, hass, path):
+        self.hass = hass
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+        self._pending = []
+        self._flush_unsub = None
+
+    # 以下方法在 executor 中运行
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def _write(self, rows):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    "INSERT INTO messages (entry_id, to_wxid, message_type, content, msg_id, new_msg_id, create_time, sent_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                conn.execute("DELETE FROM messages WHERE sent_at < ?", (time.time() - HISTORY_MAX_AGE,))
+                conn.execute(
+                    "DELETE FROM messages WHERE id <= (SELECT MAX(id) FROM messages) - ?",
+                    (HISTORY_MAX_ROWS,),
+                )
+
+    def _warm(self):
+        with self._lock:
+            self._connect()
+
+    def _query(self, sql, args):
+        with self._lock:
+            return [dict(row) for row in self._connect().execute(sql, args).fetchall()]
+
+    def _close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # 以下方法在事件循环中运行
+    @callback
+    def record(self, entry_id, to_wxid, message_type, params, response):
+        """Queue a sent message; writes are batched off the event loop."""
+        response = response if isinstance(response, dict) else {}
+        spec = MESSAGE_SPECS.get(message_type)
+        summary = params.get(spec.summary if spec else "content")
+        if isinstance(summary, str):
+            summary = summary[:HISTORY_CONTENT_LENGTH]
+        self._pending.append((
+            entry_id,
+            to_wxid,
+            message_type,
+            summary,
+            response.get("msgId"),
+            response.get("newMsgId"),
+            response.get("createTime"),
+            time.time(),
+        ))
+        if self._flush_unsub is None:
+            self._flush_unsub = async_call_later(
+                self.hass, HISTORY_FLUSH_DELAY, callback(lambda _now: self.hass.async_create_task(self.async_flush()))
+            )
+
+    async def async_warm(self):
+        """Open the database and create the schema ahead of the first message."""
+        await self.hass.async_add_executor_job(self._warm)
+
+    async def async_flush(self):
+        """Write all pending records in a single transaction."""
+        if self._flush_unsub is not None:
+            self._flush_unsub()
+            self._flush_unsub = None
+        if not self._pending:
+            return
+        rows, self._pending = self._pending, []
+        try:
+            await self.hass.async_add_executor_job(self._write, rows)
+        except Exception as e:
+            _LOGGER.error(f"Failed to write message history: {e}")
+
+    async def async_query(self, entry_id=None, to_wxid=None, msg_id=None, since=None, message_type=None, limit=20):
+        """Return recent messages, newest first."""
+        await self.async_flush()
+        clauses, args = [], []
+        if entry_id:
+            clauses.append("entry_id = ?")
+            args.append(entry_id)
+        if to_wxid:
+            clauses.append("to_wxid = ?")
+            args.append(to_wxid)
+        if msg_id:
+            clauses.append("(new_msg_id = ? OR msg_id = ?)")
+            args.extend([msg_id, msg_id])
+        if since:
+            clauses.append("sent_at >= ?")
+            args.append(since)
+        if message_type:
+            clauses.append("message_type = ?")
+            args.append(message_type)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"SELECT {', '.join(_COLUMNS)} FROM messages {where} ORDER BY sent_at DESC LIMIT ?"
+        args.append(int(limit))
+        return await self.hass.async_add_executor_job(self._query, sql, args)
+
+    async def async_close(self):
+        """Flush pending writes and close the database."""
+        await self.async_flush()
+        await self.hass.async_add_executor_job(self._close)
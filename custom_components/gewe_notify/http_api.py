@@ -3,6 +3,9 @@ import json
 import logging
 from homeassistant.components.http import HomeAssistantView
 import asyncio
+from aiohttp import web
+from .const import DOMAIN
+from .accounts import contacts_file_path
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -20,18 +23,17 @@ class GeweContactsAPI(HomeAssistantView):
 
     async def get(self, request):
         """Handle GET requests to return Gewe contacts."""
-        # 文件路径定义
-        file_path = self.hass.config.path(".storage", "gewe_contacts.json")
+        # 文件路径定义，可用 ?entry_id= 指定账号
+        file_path = contacts_file_path(self.hass, request.query.get("entry_id"))
         _LOGGER.debug(f"Attempting to load contacts from {file_path}")
 
         # 尝试加载联系人数据
         try:
-            if not os.path.exists(file_path):
-                _LOGGER.warning(f"Contacts file does not exist: {file_path}")
-                return self.json_message("Contacts file not found", status_code=404)
-
             # 使用 async_add_executor_job 来异步执行文件读取
             contacts_data = await self.hass.async_add_executor_job(self._load_contacts, file_path)
+            if contacts_data is None:
+                _LOGGER.warning(f"Contacts file does not exist: {file_path}")
+                return self.json_message("Contacts file not found", status_code=404)
 
             # 返回数据
             return self.json(contacts_data)
@@ -42,6 +44,74 @@ class GeweContactsAPI(HomeAssistantView):
 
     def _load_contacts(self, file_path):
         """Blocking function to load contacts data from file."""
+        if not os.path.exists(file_path):
+            return None
         with open(file_path, "r", encoding="utf-8") as file:
             return json.load(file)
 
+
+class GeweMediaView(HomeAssistantView):
+    """Serve processed media to the Gewe backend."""
+
+    url = "/api/gewe_notify/media/{name}"
+    name = "api:gewe_notify:media"
+    # Gewe 后端无法携带 HA 的认证信息，文件名为内容的 sha256
+    requires_auth = False
+
+    def __init__(self, media_store):
+        """Initialize the view with the media store."""
+        self.media_store = media_store
+
+    async def get(self, request, name):
+        """Handle GET requests for a processed media file."""
+        media = self.media_store.get(name)
+        if media is None:
+            return web.Response(status=404)
+        data, content_type = media
+        return web.Response(
+            body=data,
+            content_type=content_type,
+            headers={"Cache-Control": "public, max-age=86400, immutable"},
+        )
+
+class GeweQRCodeView(HomeAssistantView):
+    """Serve login QR codes from memory."""
+
+    url = "/api/gewe_notify/qrcode/{uuid}"
+    name = "api:gewe_notify:qrcode"
+    requires_auth = True  # 通过 HA 签名的 URL 访问
+
+    def __init__(self, qr_store):
+        """Initialize the view with the QR code store."""
+        self.qr_store = qr_store
+
+    async def get(self, request, uuid):
+        """Handle GET requests for a login QR code."""
+        data = self.qr_store.get(uuid)
+        if data is None:
+            return web.Response(status=404)
+        return web.Response(
+            body=data,
+            content_type="image/jpeg",
+            headers={"Cache-Control": "no-store"},
+        )
+
+class GeweCallbackView(HomeAssistantView):
+    """Receive message and status callbacks pushed by the Gewe backend."""
+
+    url = "/api/gewe_notify/callback/{webhook_id}"
+    name = "api:gewe_notify:callback"
+    # Gewe 后端无法携带 HA 的认证信息，依靠随机的 webhook_id 鉴别
+    requires_auth = False
+
+    def __init__(self, hass):
+        """Initialize the view with Home Assistant instance."""
+        self.hass = hass
+
+    async def post(self, request, webhook_id):
+        """Acknowledge immediately, parsing happens in the receiver's worker."""
+        receiver = self.hass.data.get(DOMAIN, {}).get("callback_receivers", {}).get(webhook_id)
+        if receiver is None:
+            return web.Response(status=404)
+        receiver.enqueue(await request.read())
+        return web.Response(status=200)
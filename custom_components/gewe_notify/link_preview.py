@@ -0,0 +1,102 @@
+import codecs
+import logging
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+from .cache import LRUCache
+from .const import LINK_PREVIEW_CACHE_SIZE, LINK_PREVIEW_CACHE_TTL, LINK_PREVIEW_MAX_BYTES
+from .media import resolve_url
+
+_LOGGER = logging.getLogger(__name__)
+
+# meta 标签名 -> 预览字段，按优先级排列
+META_FIELDS = {
+    "og:title": "title",
+    "twitter:title": "title",
+    "og:description": "desc",
+    "twitter:description": "desc",
+    "description": "desc",
+    "og:image": "thumb_url",
+    "og:image:url": "thumb_url",
+    "twitter:image": "thumb_url",
+}
+
+class _HeadParser(HTMLParser):
+    """Collect Open Graph/Twitter tags and <title> from the document head only."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.meta = {}
+        self.title = None
+        self.done = False
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "body":
+            self.done = True
+        elif tag == "title":
+            self._in_title = True
+        elif tag == "meta":
+            attrs = dict(attrs)
+            key = (attrs.get("property") or attrs.get("name") or "").lower()
+            if key in META_FIELDS and attrs.get("content") and key not in self.meta:
+                self.meta[key] = attrs["content"].strip()
+
+    def handle_endtag(self, tag):
+        if tag == "head":
+            self.done = True
+        elif tag == "title":
+            self._in_title = False
+
+    def handle_data(self, data):
+        if self._in_title and self.title is None and data.strip():
+            self.title = data.strip()
+
+    def preview(self):
+        result = {}
+        for key, field in META_FIELDS.items():
+            if field not in result and key in self.meta:
+                result[field] = self.meta[key]
+        if "title" not in result and self.title:
+            result["title"] = self.title
+        return result
+
+class GeweLinkPreview:
+    """Fetch link previews with a size-capped read and cache them."""
+
+    def __init__(self, hass, session, max_items=LINK_PREVIEW_CACHE_SIZE, ttl=LINK_PREVIEW_CACHE_TTL):
+        self.hass = hass
+        self.session = session
+        self._cache = LRUCache(max_items, ttl=ttl)
+
+    async def async_get(self, link_url):
+        """Return {title, desc, thumb_url} parsed from the page head."""
+        cached = self._cache.get(link_url)
+        if cached is not None:
+            return cached
+
+        url = resolve_url(self.hass, link_url)
+        parser = _HeadParser()
+        try:
+            async with self.session.get(url, headers={"Accept": "text/html"}) as response:
+                response.raise_for_status()
+                try:
+                    decoder = codecs.getincrementaldecoder(response.charset or "utf-8")(errors="ignore")
+                except LookupError:
+                    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+                received = 0
+                async for chunk in response.content.iter_chunked(8192):
+                    received += len(chunk)
+                    parser.feed(decoder.decode(chunk))
+                    if parser.done or received >= LINK_PREVIEW_MAX_BYTES:
+                        break
+                final_url = str(response.url)
+        except Exception as e:
+            _LOGGER.warning(f"Failed to fetch link preview for {link_url}: {e}")
+            return {}
+
+        preview = parser.preview()
+        if preview.get("thumb_url"):
+            preview["thumb_url"] = urljoin(final_url, preview["thumb_url"])
+        self._cache.set(link_url, preview)
+        _LOGGER.debug("Link preview for %s: %s", link_url, preview)
+        return preview
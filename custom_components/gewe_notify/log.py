@@ -0,0 +1,115 @@
+import logging
+import time
+from .cache import LRUCache
+from .const import LOG_MAX_ITEMS, LOG_MAX_LENGTH, LOG_SAMPLE_BURST, LOG_SAMPLE_WINDOW
+
+# 日志中需要脱敏的字段（参数名和接口字段名）
+REDACT_KEYS = frozenset({
+    "token", "gewe_token", "X-GEWE-TOKEN", "app_id", "appId", "webhook_id",
+})
+
+def truncate_string(s, max_length=LOG_MAX_LENGTH):
+    """ 截断字符串，确保其长度不超过 max_length """
+    return s[:max_length] + ('...' if len(s) > max_length else '') if isinstance(s, str) else str(s)
+
+def truncate_dict(d, max_items=LOG_MAX_ITEMS):
+    """ 截断字典，只保留前 max_items 个键值对 """
+    truncated = dict(list(d.items())[:max_items])
+    return str(truncated) + ('...' if len(d) > max_items else '')
+
+def redact(value):
+    """Keep only the last 4 characters of a secret, enough to tell accounts apart."""
+    if not value:
+        return value
+    value = str(value)
+    return f"***{value[-4:]}" if len(value) > 8 else "***"
+
+def _clean(value):
+    """Redact secrets in dicts and shorten long strings, recursively."""
+    if isinstance(value, dict):
+        return {
+            key: redact(item) if key in REDACT_KEYS and item else _clean(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [_clean(item) for item in value[:LOG_MAX_ITEMS]]
+    if isinstance(value, str):
+        return truncate_string(value)
+    return value
+
+class _Fields:
+    """key=value pairs that are only cleaned and formatted when a record is emitted."""
+
+    __slots__ = ("fields",)
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def __str__(self):
+        parts = []
+        for key, value in self.fields.items():
+            if key in REDACT_KEYS and value:
+                value = redact(value)
+            elif isinstance(value, dict):
+                value = truncate_dict(_clean(value))
+            else:
+                value = _clean(value)
+            parts.append(f" {key}={value}")
+        return "".join(parts)
+
+class GeweLogger:
+    """A logger for the request and send paths.
+
+    Fields are passed as keywords and formatted lazily, so a disabled level
+    costs one isEnabledFor check. Secrets are redacted, payloads truncated,
+    and calls with a sample key are rate limited during error storms.
+    """
+
+    def __init__(self, name):
+        self._logger = logging.getLogger(name)
+        self._samples = LRUCache(256)
+
+    def isEnabledFor(self, level):
+        return self._logger.isEnabledFor(level)
+
+    def _log(self, level, msg, sample, fields):
+        if not self._logger.isEnabledFor(level):
+            return
+        if sample is not None:
+            suppressed = self._sample(sample)
+            if suppressed is None:
+                return
+            if suppressed:
+                fields["suppressed"] = suppressed
+        # stacklevel 指向调用 debug()/error() 的位置，而不是这里
+        if fields:
+            self._logger.log(level, "%s%s", msg, _Fields(fields), stacklevel=3)
+        else:
+            self._logger.log(level, "%s", msg, stacklevel=3)
+
+    def _sample(self, key):
+        """Return how many records were dropped before this one, or None to drop it."""
+        now = time.monotonic()
+        state = self._samples.get(key)
+        if state is None or now - state[0] > LOG_SAMPLE_WINDOW:
+            # 新窗口：报告上个窗口丢弃的条数
+            dropped = state[2] if state else 0
+            self._samples.set(key, [now, 1, 0])
+            return dropped
+        state[1] += 1
+        if state[1] > LOG_SAMPLE_BURST:
+            state[2] += 1
+            return None
+        return 0
+
+    def debug(self, msg, sample=None, **fields):
+        self._log(logging.DEBUG, msg, sample, fields)
+
+    def info(self, msg, sample=None, **fields):
+        self._log(logging.INFO, msg, sample, fields)
+
+    def warning(self, msg, sample=None, **fields):
+        self._log(logging.WARNING, msg, sample, fields)
+
+    def error(self, msg, sample=None, **fields):
+        self._log(logging.ERROR, msg, sample, fields)
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import time
+from .qr_code import async_get_qr_store
+from .const import (
+    CONF_APP_ID,
+    CONF_GEWE_TOKEN,
+    CONF_NICKNAME,
+    CONF_WXID,
+    EVENT_LOGIN_STATUS,
+    LOGIN_MAX_ERRORS,
+    LOGIN_POLL_SCHEDULE,
+    LOGIN_TIMEOUT,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+def _poll_interval(elapsed):
+    """二维码刚展示时快速轮询，之后逐渐放慢."""
+    for until, interval in LOGIN_POLL_SCHEDULE:
+        if elapsed < until:
+            return interval
+    return LOGIN_POLL_SCHEDULE[-1][1]
+
+class GeweLoginWatcher:
+    """Watch a login QR code in the background until it is confirmed or expires."""
+
+    def __init__(self, hass, entry, api):
+        self.hass = hass
+        self.entry = entry
+        self.api = api
+        self.uuid = None
+        self.app_id = None
+        self.status = None
+        self._task = None
+        # get_qrcode 可能创建了新设备：uuid -> 新的 app_id
+        self._qr_app_ids = {}
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def remember_app_id(self, uuid, app_id):
+        """Remember the device a QR code was created for, used when login gets no app_id."""
+        self._qr_app_ids = {uuid: app_id}
+
+    def async_start(self, uuid, app_id=None):
+        """Start watching a QR code uuid, replacing any previous watcher."""
+        app_id = app_id or self._qr_app_ids.get(uuid) or self.entry.data.get(CONF_APP_ID)
+        if self.running and self.uuid == uuid and self.app_id == app_id:
+            return self.handle
+        self.async_cancel()
+        self.uuid = uuid
+        self.app_id = app_id
+        self._set_status("waiting")
+        self._task = self.hass.async_create_background_task(
+            self._async_watch(uuid, app_id), f"gewe_notify login watcher {uuid}"
+        )
+        return self.handle
+
+    def async_cancel(self):
+        """Cancel the running watcher, if any."""
+        if self.running:
+            self._task.cancel()
+            self._set_status("cancelled")
+        self._task = None
+
+    @property
+    def handle(self):
+        return {"uuid": self.uuid, "status": self.status, "entry_id": self.entry.entry_id}
+
+    def _set_status(self, status, **extra):
+        if status == self.status:
+            return
+        self.status = status
+        if status in ("success", "expired", "failed", "cancelled"):
+            async_get_qr_store(self.hass).remove(self.uuid)
+        self.hass.bus.async_fire(EVENT_LOGIN_STATUS, {**self.handle, **extra})
+        _LOGGER.debug(f"Login watcher [ uuid: {self.uuid} ] status: {status}")
+
+    async def _async_watch(self, uuid, app_id):
+        token = self.entry.data.get(CONF_GEWE_TOKEN)
+        started = time.monotonic()
+        errors = 0
+
+        while (elapsed := time.monotonic() - started) < LOGIN_TIMEOUT:
+            await asyncio.sleep(_poll_interval(elapsed))
+            login_data = await self.api.check_login(token, app_id, uuid)
+            if not login_data:
+                errors += 1
+                if errors >= LOGIN_MAX_ERRORS:
+                    self._set_status("failed")
+                    return
+                continue
+            errors = 0
+
+            login_info = login_data.get("loginInfo") or {}
+            if login_info.get("wxid"):
+                await self._async_logged_in(token, app_id, login_info["wxid"], login_data.get("nickName"))
+                return
+            # 已扫码但未确认时 nickName 会先返回
+            if login_data.get("nickName"):
+                self._set_status("scanned", nick_name=login_data["nickName"])
+            expired_time = login_data.get("expiredTime")
+            if expired_time is not None and expired_time <= 0:
+                self._set_status("expired")
+                return
+
+        self._set_status("expired")
+
+    async def _async_logged_in(self, token, app_id, wxid, nickname):
+        config = dict(self.entry.data)
+        config.update({
+            CONF_GEWE_TOKEN: token,
+            CONF_APP_ID: app_id,
+            CONF_WXID: wxid,
+        })
+        if nickname:
+            config[CONF_NICKNAME] = nickname
+        self.hass.config_entries.async_update_entry(self.entry, data=config)
+        self._set_status("success", wxid=wxid)
+        await self.hass.services.async_call(
+            "persistent_notification",
+            "create",
+            {
+                "title": "Gewe 登录成功",
+                "message": f"您的账号{wxid}已登录成功。",
+                "notification_id": "gewe_notify_loggin_successful",
+            },
+        )
+        # 重载会取消本任务，放到任务外执行
+        self.hass.async_create_task(self.hass.config_entries.async_reload(self.entry.entry_id))
@@ -0,0 +1,192 @@
+import hashlib
+import io
+import logging
+import os
+import re
+from urllib.parse import unquote, urlparse
+from homeassistant.helpers.network import NoURLAvailableError, get_url
+from .cache import LRUCache
+from .const import (
+    DEFAULT_IMAGE_FORMAT,
+    DEFAULT_IMAGE_MAX_SIZE,
+    DEFAULT_IMAGE_QUALITY,
+    MEDIA_CACHE_SIZE,
+    MEDIA_DOWNLOAD_LIMIT,
+    MEDIA_VIEW_URL,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+_SHA256 = re.compile(r"[0-9a-f]{64}")
+
+IMAGE_FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg", "jpg"),
+    "webp": ("WEBP", "image/webp", "webp"),
+}
+
+def resolve_url(hass, url):
+    """Turn a Home Assistant relative path (/local/..., /api/...) into an absolute URL."""
+    if not url or not url.startswith("/"):
+        return url
+    try:
+        return f"{get_url(hass, prefer_external=False)}{url}"
+    except NoURLAvailableError:
+        _LOGGER.warning(f"No Home Assistant URL configured, cannot resolve {url}")
+        return url
+
+def local_media_path(hass, url):
+    """Map /local/... URLs to files under the www directory."""
+    if not url or not url.startswith("/local/"):
+        return None
+    path = urlparse(url).path
+    www_path = hass.config.path("www")
+    local = os.path.normpath(os.path.join(www_path, unquote(path[len("/local/"):])))
+    return local if local.startswith(www_path + os.sep) else None
+
+def media_store_sha256(url):
+    """Return the sha256 in the file name of a GeweMediaView URL, else None."""
+    prefix = MEDIA_VIEW_URL.format(name="")
+    path = urlparse(url or "").path
+    if not path.startswith(prefix):
+        return None
+    sha256 = path[len(prefix):].partition(".")[0]
+    return sha256 if _SHA256.fullmatch(sha256) else None
+
+def _stat_validator(path):
+    stat = os.stat(path)
+    return (stat.st_size, stat.st_mtime_ns)
+
+async def async_media_validator(hass, session, url):
+    """Return a value that changes whenever the media behind a URL changes.
+
+    Media served by GeweMediaView uses the sha256 in its name, local files
+    size and mtime, remote URLs ETag/Last-Modified from a HEAD request.
+    None means the media cannot be validated and must not be cached.
+    """
+    # 本集成提供的媒体按内容命名，内容不会变化，也不支持 HEAD
+    sha256 = media_store_sha256(url)
+    if sha256:
+        return (sha256,)
+    local = local_media_path(hass, url)
+    try:
+        if local:
+            return await hass.async_add_executor_job(_stat_validator, local)
+        async with session.head(resolve_url(hass, url), allow_redirects=True) as response:
+            response.raise_for_status()
+            headers = response.headers
+            validator = (headers.get("ETag"), headers.get("Last-Modified"), headers.get("Content-Length"))
+    except Exception as e:
+        _LOGGER.debug("Failed to validate media %s: %s", url, e)
+        return None
+    # 只有 Content-Length 时同样大小的新文件无法区分
+    return validator if validator[0] or validator[1] else None
+
+class GeweMediaStore:
+    """In-memory media served to the Gewe backend through GeweMediaView."""
+
+    def __init__(self, hass, max_items=MEDIA_CACHE_SIZE):
+        self.hass = hass
+        self._media = LRUCache(max_items)
+
+    def add(self, data, content_type, ext):
+        """Store bytes under their content hash and return the served file name."""
+        name = f"{hashlib.sha256(data).hexdigest()}.{ext}"
+        self._media.set(name, (data, content_type))
+        return name
+
+    def get(self, name):
+        """Return (bytes, content_type) for a served file name."""
+        return self._media.get(name)
+
+    def url_for(self, name):
+        """Return the URL the Gewe backend downloads the media from."""
+        return resolve_url(self.hass, MEDIA_VIEW_URL.format(name=name))
+
+async def async_download(session, url, limit=MEDIA_DOWNLOAD_LIMIT):
+    """Download a URL into memory, refusing bodies larger than limit."""
+    async with session.get(url) as response:
+        response.raise_for_status()
+        if response.content_length and response.content_length > limit:
+            raise ValueError(f"Media too large: {response.content_length} bytes")
+        buffer = bytearray()
+        async for chunk in response.content.iter_chunked(64 * 1024):
+            buffer.extend(chunk)
+            if len(buffer) > limit:
+                raise ValueError(f"Media larger than {limit} bytes")
+        return bytes(buffer)
+
+def _recompress_image(data, max_size, quality, image_format):
+    """Blocking: downscale and re-encode an image, returns bytes or None if not smaller."""
+    from PIL import Image, ImageOps
+
+    pil_format = IMAGE_FORMATS[image_format][0]
+    with Image.open(io.BytesIO(data)) as img:
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_size, max_size), Image.LANCZOS)
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        out = io.BytesIO()
+        if pil_format == "JPEG":
+            img.save(out, pil_format, quality=quality, optimize=True, progressive=True)
+        else:
+            img.save(out, pil_format, quality=quality, method=4)
+    result = out.getvalue()
+    return result if len(result) < len(data) else None
+
+class GeweImageProcessor:
+    """Downscale and recompress images before the Gewe backend fetches them."""
+
+    def __init__(self, hass, session, media_store, max_items=MEDIA_CACHE_SIZE):
+        self.hass = hass
+        self.session = session
+        self.media_store = media_store
+        # sha256(source + 参数) -> 已处理的文件名
+        self._processed = LRUCache(max_items)
+
+    async def async_process(
+        self,
+        img_url,
+        max_size=DEFAULT_IMAGE_MAX_SIZE,
+        quality=DEFAULT_IMAGE_QUALITY,
+        image_format=DEFAULT_IMAGE_FORMAT,
+    ):
+        """Return a URL of the processed image, or the original URL on failure."""
+        if image_format not in IMAGE_FORMATS:
+            _LOGGER.error(f"Unsupported image format: {image_format}")
+            return img_url
+        try:
+            source = await async_download(self.session, resolve_url(self.hass, img_url))
+        except Exception as e:
+            _LOGGER.error(f"Failed to download image {img_url}: {e}")
+            return img_url
+
+        key = hashlib.sha256(source).hexdigest() + f":{max_size}:{quality}:{image_format}"
+        if key in self._processed:
+            name = self._processed.get(key)
+            if name is None:
+                return img_url
+            if self.media_store.get(name):
+                return self.media_store.url_for(name)
+
+        try:
+            result = await self.hass.async_add_executor_job(
+                _recompress_image, source, int(max_size), int(quality), image_format
+            )
+        except ImportError:
+            _LOGGER.error("Pillow is not installed, image processing disabled")
+            return img_url
+        except Exception as e:
+            _LOGGER.error(f"Failed to process image {img_url}: {e}")
+            return img_url
+
+        if result is None:
+            # 压缩后没有变小，原图直接发送
+            _LOGGER.debug("Image %s already small enough, sending as is", img_url)
+            self._processed.set(key, None)
+            return img_url
+
+        _, content_type, ext = IMAGE_FORMATS[image_format]
+        name = self.media_store.add(result, content_type, ext)
+        self._processed.set(key, name)
+        _LOGGER.debug("Image %s processed: %d -> %d bytes", img_url, len(source), len(result))
+        return self.media_store.url_for(name)
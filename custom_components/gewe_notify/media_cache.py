@@ -0,0 +1,148 @@
+import hashlib
+import logging
+import time
+from xml.sax.saxutils import quoteattr
+from homeassistant.helpers.storage import Store
+from .cache import LRUCache
+from .const import FORWARD_CACHE_KEY, FORWARD_CACHE_MAX_ITEMS, FORWARD_HASH_TTL, MEDIA_DOWNLOAD_LIMIT
+from .media import async_media_validator, media_store_sha256, resolve_url
+
+_LOGGER = logging.getLogger(__name__)
+
+# 可以转发的消息类型及其媒体 URL 参数。
+# postFile 的响应不含 CDN 信息，无法构造转发 XML，文件不计算 hash
+FORWARD_MEDIA_KEYS = {
+    "image": "img_url",
+    "video": "video_url",
+}
+
+def _attrs(**kwargs):
+    return " ".join(f"{key}={quoteattr(str(value))}" for key, value in kwargs.items() if value is not None)
+
+def build_forward_xml(message_type, data):
+    """Build the message XML used by Gewe forward endpoints from a post* response."""
+    if not isinstance(data, dict):
+        return None
+    if data.get("xml"):
+        return data["xml"]
+    file_id = data.get("fileId")
+    aes_key = data.get("aesKey")
+    if not file_id or not aes_key:
+        # postFile 不返回 CDN 信息，无法构造转发 XML
+        return None
+    if message_type == "image":
+        body = "<img " + _attrs(
+            aeskey=aes_key,
+            cdnmidimgurl=file_id,
+            cdnbigimgurl=file_id,
+            length=data.get("length"),
+            hdlength=data.get("length"),
+            md5=data.get("md5"),
+            cdnmidheight=data.get("height"),
+            cdnmidwidth=data.get("width"),
+        ) + " />"
+    elif message_type == "video":
+        # 缩略图是单独的 CDN 文件，后端没有返回时转发后缩略图会损坏，不缓存
+        thumb_url = data.get("cdnThumbUrl") or data.get("thumbFileId")
+        thumb_aes_key = data.get("cdnThumbAesKey") or data.get("thumbAesKey")
+        if not thumb_url or not thumb_aes_key:
+            return None
+        body = "<videomsg " + _attrs(
+            aeskey=aes_key,
+            cdnvideourl=file_id,
+            length=data.get("length"),
+            playlength=data.get("playLength"),
+            cdnthumbaeskey=thumb_aes_key,
+            cdnthumburl=thumb_url,
+            cdnthumblength=data.get("cdnThumbLength"),
+        ) + " />"
+    else:
+        return None
+    return f'<?xml version="1.0"?>\n<msg>\n\t{body}\n</msg>'
+
+class GeweForwardCache:
+    """Persistent cache of WeChat CDN metadata keyed by media content hash."""
+
+    def __init__(self, hass, session, max_items=FORWARD_CACHE_MAX_ITEMS):
+        self.hass = hass
+        self.session = session
+        self.max_items = max_items
+        self._store = Store(hass, 1, FORWARD_CACHE_KEY)
+        self._entries = {}
+        self._loaded = False
+        # URL -> (validator, hash)，媒体未变化时不重复下载计算 hash
+        self._url_hashes = LRUCache(256, ttl=FORWARD_HASH_TTL)
+
+    async def async_load(self):
+        """Load cached entries from .storage."""
+        data = await self._store.async_load()
+        # 后台加载，加载完成前记录的条目优先
+        early = bool(self._entries)
+        self._entries = {**(data or {}).get("entries", {}), **self._entries}
+        self._loaded = True
+        if early:
+            self._save()
+        _LOGGER.debug("Loaded %d forward cache entries.", len(self._entries))
+
+    def _data_to_save(self):
+        return {"entries": self._entries}
+
+    def _save(self):
+        # 加载完成前保存会覆盖文件中尚未读入的条目
+        if self._loaded:
+            self._store.async_delay_save(self._data_to_save, 10)
+
+    async def async_content_hash(self, url):
+        """Return the sha256 of the media behind a URL.
+
+        A cached hash is only reused while the URL's validator is unchanged,
+        so a file overwritten at the same path is hashed again.
+        """
+        # 本集成提供的媒体文件名就是内容的 sha256，无需下载
+        sha256 = media_store_sha256(url)
+        if sha256:
+            return sha256
+        validator = await async_media_validator(self.hass, self.session, url)
+        cached = self._url_hashes.get(url)
+        if validator is not None and cached and cached[0] == validator:
+            return cached[1]
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            async with self.session.get(resolve_url(self.hass, url)) as response:
+                response.raise_for_status()
+                async for chunk in response.content.iter_chunked(64 * 1024):
+                    size += len(chunk)
+                    if size > MEDIA_DOWNLOAD_LIMIT:
+                        _LOGGER.debug("Media %s too large to hash, forward cache skipped", url)
+                        return None
+                    digest.update(chunk)
+        except Exception as e:
+            _LOGGER.debug("Failed to hash media %s: %s", url, e)
+            return None
+        content_hash = digest.hexdigest()
+        if validator is not None:
+            self._url_hashes.set(url, (validator, content_hash))
+        return content_hash
+
+    def get(self, app_id, message_type, content_hash):
+        """Return the cached forward XML of an account for a media hash."""
+        entry = self._entries.get(f"{app_id}:{message_type}:{content_hash}")
+        return entry["xml"] if entry else None
+
+    def record(self, app_id, message_type, content_hash, response):
+        """Remember the CDN metadata returned by the first successful send."""
+        xml = build_forward_xml(message_type, response)
+        if not xml:
+            return
+        self._entries[f"{app_id}:{message_type}:{content_hash}"] = {"xml": xml, "ts": time.time()}
+        if len(self._entries) > self.max_items:
+            oldest = sorted(self._entries, key=lambda key: self._entries[key]["ts"])
+            for key in oldest[: len(self._entries) - self.max_items]:
+                del self._entries[key]
+        self._save()
+
+    def invalidate(self, app_id, message_type, content_hash):
+        """Forget an entry whose forward failed (e.g. CDN file expired)."""
+        if self._entries.pop(f"{app_id}:{message_type}:{content_hash}", None):
+            self._save()
@@ -0,0 +1,231 @@
+import logging
+import os
+import struct
+from .cache import LRUCache
+from .const import PROBE_CACHE_SIZE, PROBE_CACHE_TTL, PROBE_HEAD_SIZE, PROBE_MAX_VOICE_SIZE
+from .media import async_media_validator, local_media_path, resolve_url
+
+_LOGGER = logging.getLogger(__name__)
+
+SILK_HEADER = b"#!SILK_V3"
+SILK_FRAME_MS = 20
+AMR_HEADER = b"#!AMR\n"
+# AMR-NB 每种模式的帧长度（含 1 字节帧头），每帧 20ms
+AMR_FRAME_SIZES = [13, 14, 16, 18, 20, 21, 27, 32, 6, 1, 1, 1, 1, 1, 1, 1]
+
+async def _read_up_to(stream, size):
+    """Read at most size bytes from an aiohttp stream."""
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = await stream.read(size - len(buffer))
+        if not chunk:
+            break
+        buffer.extend(chunk)
+    return bytes(buffer)
+
+class _HttpReader:
+    """Read byte ranges of a remote file using HTTP range requests."""
+
+    def __init__(self, session, url):
+        self.session = session
+        self.url = url
+        self.size = None
+
+    async def read(self, offset, size):
+        headers = {"Range": f"bytes={offset}-{offset + size - 1}"}
+        async with self.session.get(self.url, headers=headers) as response:
+            response.raise_for_status()
+            if response.status == 206:
+                content_range = response.headers.get("Content-Range", "")
+                if content_range.rsplit("/", 1)[-1].isdigit():
+                    self.size = int(content_range.rsplit("/", 1)[-1])
+                return await _read_up_to(response.content, size)
+            # 服务器不支持 Range，只读取需要的部分后断开
+            if self.size is None and response.content_length:
+                self.size = response.content_length
+            data = await _read_up_to(response.content, offset + size)
+            return data[offset:]
+
+class _FileReader:
+    """Read byte ranges of a local file in the executor."""
+
+    def __init__(self, hass, path):
+        self.hass = hass
+        self.path = path
+        self.size = None
+
+    def _read(self, offset, size):
+        with open(self.path, "rb") as file:
+            self.size = os.fstat(file.fileno()).st_size
+            file.seek(offset)
+            return file.read(size)
+
+    async def read(self, offset, size):
+        return await self.hass.async_add_executor_job(self._read, offset, size)
+
+def _silk_duration_ms(data):
+    """Count SILK frames (20ms each) after the header."""
+    pos = data.find(SILK_HEADER)
+    if pos < 0:
+        return None
+    pos += len(SILK_HEADER)
+    frames = 0
+    while pos + 2 <= len(data):
+        (length,) = struct.unpack_from("<h", data, pos)
+        if length <= 0:
+            break
+        pos += 2 + length
+        frames += 1
+    return frames * SILK_FRAME_MS
+
+def _amr_duration_ms(data):
+    """Count AMR-NB frames (20ms each) after the header."""
+    pos = len(AMR_HEADER)
+    frames = 0
+    while pos < len(data):
+        pos += AMR_FRAME_SIZES[(data[pos] >> 3) & 0x0F]
+        frames += 1
+    return frames * 20
+
+def _parse_mvhd(data):
+    """Return duration in seconds from the payload of an mvhd box."""
+    version = data[0]
+    if version == 1:
+        timescale, duration = struct.unpack_from(">IQ", data, 20)
+    else:
+        timescale, duration = struct.unpack_from(">II", data, 12)
+    if not timescale:
+        return None
+    return duration / timescale
+
+def _find_box(data, box_type):
+    """Return the payload of the first box of the given type in data."""
+    pos = 0
+    while pos + 8 <= len(data):
+        size, kind = struct.unpack_from(">I4s", data, pos)
+        header = 8
+        if size == 1:
+            (size,) = struct.unpack_from(">Q", data, pos + 8)
+            header = 16
+        elif size == 0:
+            size = len(data) - pos
+        if size < header:
+            return None
+        if kind == box_type:
+            return data[pos + header:pos + size]
+        pos += size
+    return None
+
+async def _mp4_duration(reader):
+    """Walk the top level MP4 boxes with range reads until moov is found."""
+    offset = 0
+    head = await reader.read(0, PROBE_HEAD_SIZE)
+    buffer_offset, buffer = 0, head
+    for _ in range(64):
+        rel = offset - buffer_offset
+        if rel < 0 or rel + 16 > len(buffer):
+            buffer_offset, buffer = offset, await reader.read(offset, 16)
+            rel = 0
+        if len(buffer) - rel < 8:
+            return None
+        size, kind = struct.unpack_from(">I4s", buffer, rel)
+        header = 8
+        if size == 1:
+            (size,) = struct.unpack_from(">Q", buffer, rel + 8)
+            header = 16
+        elif size == 0 and reader.size:
+            size = reader.size - offset
+        if size < header:
+            return None
+        if kind == b"moov":
+            if rel + size <= len(buffer):
+                moov = buffer[rel + header:rel + size]
+            else:
+                moov = await reader.read(offset + header, size - header)
+            mvhd = _find_box(moov, b"mvhd")
+            return _parse_mvhd(mvhd) if mvhd else None
+        offset += size
+        if reader.size and offset >= reader.size:
+            return None
+    return None
+
+class GeweMediaProber:
+    """Probe voice/video duration from container headers and extract video thumbnails."""
+
+    def __init__(self, hass, session, media_store, max_items=PROBE_CACHE_SIZE):
+        self.hass = hass
+        self.session = session
+        self.media_store = media_store
+        self._cache = LRUCache(max_items, ttl=PROBE_CACHE_TTL)
+
+    def _reader(self, url):
+        local = local_media_path(self.hass, url)
+        if local:
+            return _FileReader(self.hass, local)
+        return _HttpReader(self.session, resolve_url(self.hass, url))
+
+    async def _async_key(self, kind, url):
+        """Cache key of a URL; it changes when the file is replaced at the same path.
+
+        None when the media has no validator, the result is then not cached.
+        """
+        validator = await async_media_validator(self.hass, self.session, url)
+        return None if validator is None else (kind, url, validator)
+
+    async def async_voice_duration(self, voice_url):
+        """Return the voice duration in milliseconds."""
+        key = await self._async_key("voice", voice_url)
+        if key is not None and key in self._cache:
+            return self._cache.get(key)
+        duration = None
+        try:
+            data = await self._reader(voice_url).read(0, PROBE_MAX_VOICE_SIZE)
+            if data.startswith(AMR_HEADER):
+                duration = _amr_duration_ms(data)
+            else:
+                duration = _silk_duration_ms(data)
+        except Exception as e:
+            _LOGGER.error(f"Failed to probe voice {voice_url}: {e}")
+            return None
+        if duration is None:
+            _LOGGER.warning(f"Unknown voice format: {voice_url}")
+        if key is not None:
+            self._cache.set(key, duration)
+        return duration
+
+    async def async_video_duration(self, video_url):
+        """Return the video duration in whole seconds."""
+        key = await self._async_key("video", video_url)
+        if key is not None and key in self._cache:
+            return self._cache.get(key)
+        try:
+            seconds = await _mp4_duration(self._reader(video_url))
+        except Exception as e:
+            _LOGGER.error(f"Failed to probe video {video_url}: {e}")
+            return None
+        duration = max(1, round(seconds)) if seconds else None
+        if key is not None:
+            self._cache.set(key, duration)
+        return duration
+
+    async def async_video_thumbnail(self, video_url):
+        """Extract a poster frame with ffmpeg and return its served URL."""
+        key = await self._async_key("thumb", video_url)
+        name = self._cache.get(key) if key is not None else None
+        if name and self.media_store.get(name):
+            return self.media_store.url_for(name)
+        try:
+            from homeassistant.components.ffmpeg import IMAGE_JPEG, async_get_image
+
+            image = await async_get_image(
+                self.hass, resolve_url(self.hass, video_url), output_format=IMAGE_JPEG
+            )
+        except Exception as e:
+            _LOGGER.error(f"Failed to extract thumbnail from {video_url}: {e}")
+            return None
+        if not image:
+            return None
+        name = self.media_store.add(image, "image/jpeg", "jpg")
+        if key is not None:
+            self._cache.set(key, name)
+        return self.media_store.url_for(name)
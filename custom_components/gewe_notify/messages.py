@@ -0,0 +1,157 @@
+from dataclasses import dataclass
+from typing import Any, Callable
+
+def _ats(value):
+    """ats may be a list or a comma separated string."""
+    if isinstance(value, (list, tuple)):
+        return ",".join(str(item) for item in value)
+    return str(value)
+
+def _text(value):
+    if isinstance(value, (dict, list)):
+        raise TypeError("text expected")
+    return str(value)
+
+def _positive_int(value):
+    if isinstance(value, bool):
+        raise TypeError("number expected")
+    value = int(float(value))
+    if value < 0:
+        raise ValueError("must not be negative")
+    return value
+
+@dataclass(frozen=True, slots=True)
+class GeweField:
+    """One message parameter and the API key it maps to."""
+
+    param: str
+    key: str
+    required: bool = True
+    coerce: Callable[[Any], Any] = _text
+    # 发送前的预处理（探测、链接预览等）可以补全的字段
+    auto: bool = False
+    default: Any = None
+
+@dataclass(frozen=True, slots=True)
+class GeweMessageSpec:
+    """A Gewe message kind: endpoint, fields and how to build its payload."""
+
+    name: str
+    path: str
+    fields: tuple[GeweField, ...]
+    offline_message: str
+    # 发送记录里保存的内容摘要字段
+    summary: str
+
+    def validate(self, params, partial=False):
+        """Check and convert every field without any I/O.
+
+        partial skips missing required fields that pre-send steps fill in.
+        Returns the API fields; raises ValueError listing every problem.
+        """
+        values = {}
+        errors = []
+        for field in self.fields:
+            value = params.get(field.param)
+            if value is None or value == "":
+                if field.default is not None:
+                    values[field.key] = field.default
+                elif field.required and not (partial and field.auto):
+                    errors.append(f"{field.param} is required")
+                continue
+            try:
+                values[field.key] = field.coerce(value)
+            except (TypeError, ValueError):
+                errors.append(f"{field.param} is invalid: {value!r}")
+        if errors:
+            raise ValueError(f"Invalid {self.name} message: {', '.join(errors)}")
+        return values
+
+    def build(self, template, to_wxid, params):
+        """Build the request payload from a per-account template."""
+        return {**template, "toWxid": to_wxid, **self.validate(params)}
+
+def _spec(name, endpoint, offline_message, summary, *fields):
+    return GeweMessageSpec(name, f"/v2/api/message/{endpoint}", fields, offline_message, summary)
+
+_XML = GeweField("xml", "xml")
+
+# 消息类型注册表，按名字 O(1) 查找
+MESSAGE_SPECS = {spec.name: spec for spec in (
+    _spec(
+        "text", "postText", "微信已离线，无法发送文本消息", "content",
+        GeweField("content", "content"),
+        GeweField("ats", "ats", required=False, coerce=_ats),
+    ),
+    _spec(
+        "file", "postFile", "微信已离线，无法发送文件消息", "file_url",
+        GeweField("file_url", "fileUrl"),
+        GeweField("file_name", "fileName", auto=True),
+    ),
+    _spec(
+        "image", "postImage", "微信已离线，无法发送图片消息", "img_url",
+        GeweField("img_url", "imgUrl"),
+    ),
+    _spec(
+        "voice", "postVoice", "微信已离线，无法发送语音消息", "voice_url",
+        GeweField("voice_url", "voiceUrl"),
+        GeweField("voice_duration", "voiceDuration", coerce=_positive_int, auto=True),
+    ),
+    _spec(
+        "video", "postVideo", "微信已离线，无法发送视频消息", "video_url",
+        GeweField("video_url", "videoUrl"),
+        GeweField("video_duration", "videoDuration", coerce=_positive_int, auto=True),
+        GeweField("thumb_url", "thumbUrl", auto=True),
+    ),
+    _spec(
+        "link", "postLink", "微信已离线，无法发送链接消息", "link_url",
+        GeweField("link_url", "linkUrl"),
+        GeweField("title", "title", auto=True),
+        GeweField("desc", "desc", default=""),
+        GeweField("thumb_url", "thumbUrl", default=""),
+    ),
+    _spec(
+        "emoji", "postEmoji", "微信已离线，无法发送表情消息", "emoji_md5",
+        GeweField("emoji_md5", "emojiMd5"),
+        GeweField("emoji_size", "emojiSize", coerce=_positive_int),
+    ),
+    _spec(
+        "app", "postAppMsg", "微信已离线，无法发送 appmsg 消息", "appmsg",
+        GeweField("appmsg", "appmsg"),
+    ),
+    _spec(
+        "mini_app", "postMiniApp", "微信已离线，无法发送小程序消息", "title",
+        GeweField("mini_app_id", "miniAppId"),
+        GeweField("user_name", "userName"),
+        GeweField("title", "title"),
+        GeweField("cover_img_url", "coverImgUrl"),
+        GeweField("page_path", "pagePath"),
+        GeweField("display_name", "displayName"),
+    ),
+    _spec(
+        "name_card", "postNameCard", "微信已离线，无法发送名片消息", "name_card_wxid",
+        GeweField("name_card_wxid", "nameCardWxid"),
+        GeweField("nick_name", "nickName"),
+    ),
+    _spec("forward_image", "forwardImage", "微信已离线，无法转发消息", "xml", _XML),
+    _spec("forward_file", "forwardFile", "微信已离线，无法转发消息", "xml", _XML),
+    _spec("forward_video", "forwardVideo", "微信已离线，无法转发消息", "xml", _XML),
+    _spec("forward_link", "forwardUrl", "微信已离线，无法转发消息", "xml", _XML),
+    _spec(
+        "forward_mini_app", "forwardMiniApp", "微信已离线，无法转发消息", "xml",
+        _XML,
+        GeweField("cover_img_url", "coverImgUrl"),
+    ),
+)}
+
+# 所有消息类型用到的参数名，notify 只从 data 中取这些
+MESSAGE_PARAMS = frozenset(field.param for spec in MESSAGE_SPECS.values() for field in spec.fields)
+
+def resolve_message_type(message_type, forward_type=None):
+    """Map notify's message_type (and forward_type for "forward") to a registered spec."""
+    if message_type == "forward":
+        message_type = f"forward_{forward_type}"
+    spec = MESSAGE_SPECS.get(message_type)
+    if spec is None:
+        raise ValueError(f"Unsupported message type: {message_type}")
+    return spec
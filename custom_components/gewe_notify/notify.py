@@ -1,25 +1,59 @@
-import logging
+import asyncio
+import os
+from urllib.parse import urlparse
+import voluptuous as vol
+import homeassistant.helpers.config_validation as cv
 from homeassistant.components.notify import BaseNotificationService
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
-from .const import DOMAIN, CONF_GEWE_TOKEN, CONF_APP_ID
+from .const import (
+    DOMAIN,
+    CONF_GEWE_TOKEN,
+    CONF_APP_ID,
+    DEFAULT_IMAGE_FORMAT,
+    DEFAULT_IMAGE_MAX_SIZE,
+    DEFAULT_IMAGE_QUALITY,
+    TEXT_MAX_BYTES,
+    TEXT_MIN_BYTES,
+)
+from .media_cache import FORWARD_MEDIA_KEYS
+from .messages import MESSAGE_PARAMS, resolve_message_type
+from .text_splitter import split_text
+from .accounts import loaded_entries, resolve_account
+from .log import GeweLogger
+from .websocket_api import async_publish_message_status
+from .scheduler import SCHEDULE_KEYS, due_time
+from .templates import TEMPLATE_FIELDS, compile_template, contact_variables
 
-_LOGGER = logging.getLogger(__name__)
+_LOGGER = GeweLogger(__name__)
+
+def _split_options(data):
+    """Check data.max_bytes/part_marker before anything is sent; raises ValueError."""
+    try:
+        max_bytes = int(data.get("max_bytes", TEXT_MAX_BYTES))
+        markers = cv.boolean(data.get("part_marker", True))
+    except (TypeError, ValueError, vol.Invalid) as e:
+        raise ValueError(f"Invalid max_bytes/part_marker: {e}") from e
+    if max_bytes < TEXT_MIN_BYTES:
+        raise ValueError(f"max_bytes must be at least {TEXT_MIN_BYTES}")
+    return {"max_bytes": max_bytes, "markers": markers}
 
 class GeweNotifyService(BaseNotificationService):
     """Notification service for Gewe Notify."""
 
-    def __init__(self, hass):
-        """Initialize the notification service."""
+    def __init__(self, hass, entry_id):
+        """Initialize the notification service of one account."""
         self.hass = hass
-        self.token = None
-        self.appid = None
-        self.wxid = None
-        try:
-            self.api = hass.data[DOMAIN]["api"]
-        except KeyError:
-            _LOGGER.error("API instance not found in hass.data. Ensure integration is set up correctly.")
-            raise
+        self.entry_id = entry_id
+        self._recipient_locks = {}
+
+    def _account_for(self, to_wxid, account=None, routing=None):
+        """Pick the account that sends to a recipient."""
+        if routing:
+            return self.hass.data[DOMAIN]["router"].select(to_wxid, routing)
+        if account:
+            return resolve_account(self.hass, account)
+        return loaded_entries(self.hass).get(self.entry_id)
 
     async def async_send_message(self, message="", **kwargs):
         """Send a message asynchronously."""
@@ -28,47 +62,287 @@ class GeweNotifyService(BaseNotificationService):
             _LOGGER.error("No valid target specified.")
             return
 
-        to_wxid = targets[0]  # 如果只支持单个目标，可以直接取第一个
-        self.token, self.appid, self.wxid = await self.api.get_token_from_file()
-        _LOGGER.debug(f"Sending message to target: {to_wxid}")
-        _LOGGER.debug(f"Read token: {self.token} appId: {self.appid}.")
+        _LOGGER.debug("Sending message", targets=targets)
 
         # 获取标题（可选）
         title = kwargs.get("title", None)
 
         # 从 data 中获取额外的参数
         data = kwargs.get("data", {}) or {}
-        message_type = data.get("message_type", "text")  # 默认为文本消息
-        file_url = data.get("file_url", None)
-        img_url = data.get("img_url", None)
-        ats = data.get("ats", None)
-        voice_url = data.get("voice_url", None)
-        video_url = data.get("video_url", None)
-        video_duration = data.get("video_duration", None)
-        thumb_url = data.get("thumb_url", None)
+        try:
+            # 默认为文本消息；message_type: forward 时用 forward_type 指定转发类型
+            spec = resolve_message_type(data.get("message_type", "text"), data.get("forward_type"))
+        except ValueError as e:
+            _LOGGER.error("Invalid notify data", error=e)
+            return
+        message_type = spec.name
+        # data 中所有消息字段都原样传给接口，标题优先取 data.title
+        params = {key: data.get(key) for key in MESSAGE_PARAMS}
+        params["content"] = message
+        params["title"] = data.get("title", title)
+        if message_type == "file" and params["file_url"] and not params["file_name"]:
+            params["file_name"] = os.path.basename(urlparse(params["file_url"]).path) or "file"
+
+        # 联网之前先校验所有字段，探测/预览可以补全的字段稍后再查
+        try:
+            spec.validate(params, partial=True)
+            split = _split_options(data) if message_type == "text" else None
+        except ValueError as e:
+            _LOGGER.error("Invalid notify data", error=e)
+            return
 
+        # 按接收人渲染的模板只编译一次，字段写错时不发送。
+        # 只编译调用方填写的字段，链接预览等自动补全的内容按原文发送
+        templates = None
+        if data.get("personalize"):
+            try:
+                templates = {
+                    field: compile_template(params[field])
+                    for field in TEMPLATE_FIELDS if isinstance(params.get(field), str) and params[field]
+                }
+            except ValueError as e:
+                _LOGGER.error("Invalid notify data", error=e)
+                return
+
+        # 定时/延迟/免打扰时段：入队后到点再走完整的发送流程
+        scheduler = self.hass.data[DOMAIN].get("scheduler")
+        if scheduler and any(data.get(key) for key in SCHEDULE_KEYS):
+            try:
+                when = due_time(data)
+            except ValueError as e:
+                _LOGGER.error("Invalid notify data", error=e)
+                return
+            if when is not None:
+                scheduled = {
+                    "target": targets,
+                    "title": title,
+                    "data": {key: value for key, value in data.items() if key not in SCHEDULE_KEYS},
+                }
+                job_id = scheduler.async_schedule(self.entry_id, when, message, scheduled, data.get("schedule_id"))
+                for to_wxid in targets:
+                    async_publish_message_status(
+                        self.hass, self.entry_id, to_wxid, message_type, "scheduled",
+                        schedule_id=job_id, send_at=when.isoformat(),
+                    )
+                return
+
+        if message_type == "link":
+            await self._async_fill_link_preview(params)
+            # 描述用消息内容兜底时同样按接收人渲染
+            if templates and "desc" not in templates and "content" in templates and params["desc"] == params["content"]:
+                templates["desc"] = templates["content"]
+
+        # 可选：发送前压缩图片
+        if message_type == "image" and params["img_url"] and data.get("compress_image", False):
+            processor = self.hass.data[DOMAIN].get("image_processor")
+            if processor:
+                params["img_url"] = await processor.async_process(
+                    params["img_url"],
+                    max_size=data.get("image_max_size", DEFAULT_IMAGE_MAX_SIZE),
+                    quality=data.get("image_quality", DEFAULT_IMAGE_QUALITY),
+                    image_format=data.get("image_format", DEFAULT_IMAGE_FORMAT),
+                )
+
+        # 未提供时长/缩略图时自动探测
+        prober = self.hass.data[DOMAIN].get("media_prober")
+        if prober and message_type == "voice" and params["voice_url"] and not params["voice_duration"]:
+            params["voice_duration"] = await prober.async_voice_duration(params["voice_url"])
+        if prober and message_type == "video" and params["video_url"]:
+            if not params["video_duration"]:
+                params["video_duration"] = await prober.async_video_duration(params["video_url"])
+            if not params["thumb_url"]:
+                params["thumb_url"] = await prober.async_video_thumbnail(params["video_url"])
+
+        # 补全之后再完整校验一次，仍不完整则不发送
         try:
-            response = await self.api.send_message(
-                self.token,
-                self.appid,
-                to_wxid,
-                message_type,  # 消息类型
-                content=message,  # 必须的消息内容
-                title=title,  # 标题（可选）
-                ats=ats,  # @ 用户（可选）
-                file_url=file_url,  # 文件 URL（可选）
-                img_url=img_url,  # 图片 URL（可选）
-                voice_url=voice_url,  # 语音 URL（可选）
-                video_url=video_url,  # 视频 URL（可选）
-                video_duration=video_duration,  # 视频时长（可选）
-                thumb_url=thumb_url,  # 缩略图 URL（可选）
-            )
+            spec.validate(params)
+        except ValueError as e:
+            _LOGGER.error("Invalid notify data", error=e)
+            return
+
+        # 超长文本分段发送，使用模板时渲染后再按接收人分段
+        if message_type == "text" and message and not templates:
+            self._split_text(params, split)
+
+        # 图片/文件/视频：相同内容只上传一次，之后走转发接口
+        content_hash = None
+        forward_cache = self.hass.data[DOMAIN].get("forward_cache")
+        media_key = FORWARD_MEDIA_KEYS.get(message_type)
+        if forward_cache and media_key and params[media_key]:
+            content_hash = await forward_cache.async_content_hash(params[media_key])
+
+        # 按账号分组：可指定 data.account，或用 data.routing 在多个账号间分流
+        groups = {}
+        for to_wxid in targets:
+            runtime = self._account_for(to_wxid, data.get("account"), data.get("routing"))
+            if runtime is None:
+                _LOGGER.error("No Gewe account available", to_wxid=to_wxid)
+                continue
+            groups.setdefault(runtime["entry"].entry_id, (runtime, []))[1].append(to_wxid)
+
+        await asyncio.gather(*(
+            self._async_send_group(runtime, group_targets, message_type, params, content_hash, templates, split)
+            for runtime, group_targets in groups.values()
+        ))
+
+    def _split_text(self, params, split):
+        """Put the parts of a text that is too long into params["parts"]."""
+        parts = split_text(params["content"], **split)
+        if len(parts) > 1:
+            _LOGGER.debug("Text split", parts=len(parts))
+            params["parts"] = parts
+        return params
+
+    async def _async_personalize(self, runtime, targets, message_type, params, templates, split):
+        """Render the templated fields for every recipient of one account."""
+        snapshot = await self.hass.data[DOMAIN]["contacts"].async_get(runtime["entry"].entry_id)
+        friends, chatrooms = snapshot["friends"], snapshot["chatrooms"]
+        rendered = {}
+        for to_wxid in targets:
+            variables = contact_variables(to_wxid, friends.get(to_wxid) or chatrooms.get(to_wxid))
+            recipient = dict(params)
+            for field, template in templates.items():
+                recipient[field] = template.render(variables)
+            if message_type == "text" and recipient["content"]:
+                self._split_text(recipient, split)
+            rendered[to_wxid] = recipient
+        return rendered
+
+    async def _async_send_group(self, runtime, targets, message_type, params, content_hash=None, templates=None, split=None):
+        """Send to the recipients assigned to one account."""
+        if templates:
+            rendered = await self._async_personalize(runtime, targets, message_type, params, templates, split)
+        else:
+            rendered = dict.fromkeys(targets, params)
+        # 媒体消息第一个目标先发送以获取 CDN 信息，其余目标并发发送；
+        # 不同接收人之间并发，同一接收人按顺序
+        remaining = targets
+        if content_hash:
+            await self._async_send_to(runtime, targets[0], message_type, rendered[targets[0]], content_hash, split)
+            remaining = targets[1:]
+        if remaining:
+            await asyncio.gather(*(
+                self._async_send_to(runtime, to_wxid, message_type, rendered[to_wxid], content_hash, split)
+                for to_wxid in remaining
+            ))
+
+    async def _async_fill_link_preview(self, params):
+        """Fill missing title/desc/thumb_url of a link message from the page's meta tags."""
+        if not params["link_url"]:
+            return
+        link_preview = self.hass.data[DOMAIN].get("link_preview")
+        if link_preview and not (params["title"] and params["desc"] and params["thumb_url"]):
+            preview = await link_preview.async_get(params["link_url"])
+            for field in ("title", "desc", "thumb_url"):
+                if not params[field]:
+                    params[field] = preview.get(field)
+        # 仍然缺失时用消息内容和链接兜底
+        params["title"] = params["title"] or params["link_url"]
+        params["desc"] = params["desc"] or params["content"] or ""
+        params["thumb_url"] = params["thumb_url"] or ""
+
+    def _recipient_lock(self, to_wxid):
+        """Return the lock that keeps messages to one recipient in order."""
+        lock = self._recipient_locks.get(to_wxid)
+        if lock is None:
+            lock = self._recipient_locks[to_wxid] = asyncio.Lock()
+        return lock
+
+    async def _async_resolve_ats(self, runtime, to_wxid, params, split):
+        """Turn names in ats into wxids and put "@name" in front of the text.
+
+        The prefix counts towards max_bytes, so the text is split again with
+        the prefix's size taken off the budget. Raises ValueError when the
+        prefix leaves too little room.
+        """
+        chatroom_members = self.hass.data[DOMAIN].get("chatroom_members")
+        if not chatroom_members or not to_wxid.endswith("@chatroom"):
+            return params
+        ats, prefix = await chatroom_members.async_resolve(runtime, to_wxid, params["ats"])
+        params = dict(params, ats=ats)
+        if not prefix:
+            return params
+        params.pop("parts", None)
+        split = split or {}
+        parts = split_text(
+            params["content"] or "",
+            max_bytes=split.get("max_bytes", TEXT_MAX_BYTES) - len(prefix.encode("utf-8")),
+            markers=split.get("markers", True),
+        )
+        if len(parts) > 1:
+            params["parts"] = [prefix + parts[0], *parts[1:]]
+        else:
+            params["content"] = prefix + (params["content"] or "")
+        return params
+
+    async def _async_send_to(self, runtime, to_wxid, message_type, params, content_hash=None, split=None):
+        """Send one message to a single target, keeping per-recipient order."""
+        if message_type == "text" and params["ats"]:
+            try:
+                params = await self._async_resolve_ats(runtime, to_wxid, params, split)
+            except ValueError as e:
+                _LOGGER.error("Too many mentions for max_bytes", to_wxid=to_wxid, error=e)
+                return
+        async with self._recipient_lock(to_wxid):
+            parts = params.get("parts")
+            if not parts:
+                await self._async_send_one(runtime, to_wxid, message_type, params, content_hash)
+                return
+            # 分段文本按顺序逐条发送，@ 只放在第一段
+            for index, part in enumerate(parts):
+                part_params = dict(params, content=part, ats=params["ats"] if index == 0 else None)
+                if not await self._async_send_one(runtime, to_wxid, message_type, part_params):
+                    _LOGGER.error("Stop sending remaining parts", to_wxid=to_wxid, remaining=len(parts) - index - 1)
+                    return
+
+    async def _async_send_one(self, runtime, to_wxid, message_type, params, content_hash=None):
+        """Send one message, forwarding cached media when possible."""
+        forward_cache = self.hass.data[DOMAIN].get("forward_cache")
+        api = runtime["api"]
+        entry = runtime["entry"]
+        token = entry.data.get(CONF_GEWE_TOKEN)
+        app_id = entry.data.get(CONF_APP_ID)
+        params = {key: value for key, value in params.items() if key != "parts"}
+        response = None
+        forwarded = False
+        async_publish_message_status(self.hass, entry.entry_id, to_wxid, message_type, "sending")
+        try:
+            if content_hash and forward_cache:
+                xml = forward_cache.get(app_id, message_type, content_hash)
+                if xml:
+                    response = await api.forward_message(
+                        token, app_id, to_wxid, message_type, xml
+                    )
+                    forwarded = bool(response)
+                    if not response:
+                        _LOGGER.debug("Forward failed, uploading again", to_wxid=to_wxid)
+                        forward_cache.invalidate(app_id, message_type, content_hash)
+
+            if not response:
+                response = await api.send_message(
+                    token,
+                    app_id,
+                    to_wxid,
+                    message_type,  # 消息类型
+                    **params,
+                )
+                if response and content_hash and forward_cache:
+                    forward_cache.record(app_id, message_type, content_hash, response)
+
             if response:
-                _LOGGER.debug(f"Message sent successfully to {to_wxid}")
+                _LOGGER.debug("Message sent", to_wxid=to_wxid, message_type=message_type)
+                history = self.hass.data[DOMAIN].get("history")
+                if history:
+                    history.record(entry.entry_id, to_wxid, message_type, params, response)
             else:
-                _LOGGER.error(f"Failed to send message to {to_wxid}")
+                _LOGGER.error("Failed to send message", sample=("failed", entry.entry_id), to_wxid=to_wxid)
         except Exception as e:
-            _LOGGER.error(f"Error sending message to {to_wxid}: {e}")
+            _LOGGER.error("Error sending message", sample=("error", entry.entry_id), to_wxid=to_wxid, error=e)
+        async_publish_message_status(
+            self.hass, entry.entry_id, to_wxid, message_type,
+            "sent" if response else "failed", response, forwarded=forwarded,
+        )
+        return response
 
 async def async_get_service(
     hass: HomeAssistant,
@@ -76,5 +350,10 @@ async def async_get_service(
     discovery_info: DiscoveryInfoType | None = None,
 ) -> GeweNotifyService | None:
     """Get the Gewe notify service."""
-    return GeweNotifyService(hass)
+    if discovery_info is None:
+        return None
+    service = GeweNotifyService(hass, discovery_info["entry_id"])
+    # 定时消息到点后由对应账号的服务发送
+    hass.data[DOMAIN]["notify_services"][discovery_info["entry_id"]] = service
+    return service
 
@@ -0,0 +1,57 @@
+import base64
+import logging
+import os
+from datetime import timedelta
+from homeassistant.components.http.auth import async_sign_path
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_call_later
+from .const import DOMAIN, QR_CODE_TTL, QR_CODE_VIEW_URL
+from .http_api import GeweQRCodeView
+
+_LOGGER = logging.getLogger(__name__)
+
+class GeweQRCodeStore:
+    """Keep login QR codes in memory until they expire or are used."""
+
+    def __init__(self, hass):
+        self.hass = hass
+        self._codes = {}
+
+    def add(self, uuid, qr_code_base64, ttl=QR_CODE_TTL):
+        """Decode and store a QR code, returning a signed URL to it."""
+        data = base64.b64decode(qr_code_base64.split(",", 1)[-1])
+        self.remove(uuid)
+        cancel = async_call_later(self.hass, ttl, callback(lambda _now: self.remove(uuid)))
+        self._codes[uuid] = (data, cancel)
+        return async_sign_path(
+            self.hass, QR_CODE_VIEW_URL.format(uuid=uuid), timedelta(seconds=ttl)
+        )
+
+    def get(self, uuid):
+        """Return the QR code bytes for a uuid."""
+        item = self._codes.get(uuid)
+        return item[0] if item else None
+
+    def remove(self, uuid):
+        """Drop a QR code, e.g. after login succeeded."""
+        item = self._codes.pop(uuid, None)
+        if item:
+            item[1]()
+            _LOGGER.debug(f"QR Code [ uuid: {uuid} ] removed.")
+
+def _remove_legacy_qr_file(path):
+    """Blocking: old versions wrote the QR code world-readable under www."""
+    if os.path.exists(path):
+        os.remove(path)
+
+def async_get_qr_store(hass):
+    """Return the QR code store, registering its view on first use."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    store = domain_data.get("qr_store")
+    if store is None:
+        store = domain_data["qr_store"] = GeweQRCodeStore(hass)
+        hass.http.register_view(GeweQRCodeView(store))
+        hass.async_add_executor_job(
+            _remove_legacy_qr_file, hass.config.path("www", "gewe_qr_code.jpg")
+        )
+    return store
@@ -0,0 +1,213 @@
+import heapq
+import itertools
+import logging
+import secrets
+from datetime import datetime, timedelta
+import voluptuous as vol
+import homeassistant.helpers.config_validation as cv
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_track_point_in_utc_time
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+from .const import DOMAIN, SCHEDULE_MAX_LATENESS, SCHEDULE_STORAGE_KEY
+
+_LOGGER = logging.getLogger(__name__)
+
+# notify data 中只用于定时的字段，真正发送时去掉
+SCHEDULE_KEYS = ("send_at", "delay", "quiet_hours", "schedule_id")
+
+def _parse_send_at(value, now):
+    """send_at may be a timestamp, a datetime string or a time of day (next occurrence)."""
+    if isinstance(value, (int, float)):
+        return dt_util.utc_from_timestamp(value)
+    text = str(value).strip()
+    parsed = dt_util.parse_datetime(text)
+    if parsed is not None:
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=dt_util.get_default_time_zone())
+        return dt_util.as_utc(parsed)
+    time_of_day = dt_util.parse_time(text)
+    if time_of_day is None:
+        raise ValueError(f"Invalid send_at: {value}")
+    local_now = dt_util.as_local(now)
+    when = datetime.combine(local_now.date(), time_of_day, tzinfo=local_now.tzinfo)
+    if when <= local_now:
+        when += timedelta(days=1)
+    return dt_util.as_utc(when)
+
+def _parse_quiet_hours(value):
+    """Accept "22:00-07:00" or {"start": "22:00", "end": "07:00"}."""
+    if isinstance(value, dict):
+        start, end = value.get("start"), value.get("end")
+    else:
+        start, _, end = str(value).partition("-")
+    start, end = dt_util.parse_time(str(start).strip()), dt_util.parse_time(str(end).strip())
+    if start is None or end is None:
+        raise ValueError(f"Invalid quiet_hours: {value}")
+    return start, end
+
+def _after_quiet_hours(when, quiet_hours):
+    """Move a UTC time falling inside quiet hours to the end of the quiet period."""
+    start, end = quiet_hours
+    local = dt_util.as_local(when)
+    current = local.time()
+    if start <= end:
+        inside = start <= current < end
+    else:
+        # 跨午夜，例如 22:00-07:00
+        inside = current >= start or current < end
+    if not inside:
+        return when
+    end_at = datetime.combine(local.date(), end, tzinfo=local.tzinfo)
+    if end_at <= local:
+        end_at += timedelta(days=1)
+    return dt_util.as_utc(end_at)
+
+def due_time(data, now=None):
+    """Return when a notify call should be sent (UTC), or None to send right away."""
+    now = now or dt_util.utcnow()
+    when = now
+    if data.get("send_at") is not None:
+        when = _parse_send_at(data["send_at"], now)
+    if data.get("delay") is not None:
+        try:
+            when += cv.time_period(data["delay"])
+        except vol.Invalid as e:
+            raise ValueError(f"Invalid delay: {data['delay']}") from e
+    if data.get("quiet_hours"):
+        when = _after_quiet_hours(when, _parse_quiet_hours(data["quiet_hours"]))
+    return when if when > now else None
+
+class GeweScheduler:
+    """One persistent heap and one timer for every scheduled notification."""
+
+    def __init__(self, hass):
+        self.hass = hass
+        self._store = Store(hass, 1, SCHEDULE_STORAGE_KEY)
+        self._jobs = {}
+        self._heap = []
+        self._seq = itertools.count()
+        self._timer = None
+        self._timer_at = None
+        self._loaded = False
+        self._running = False
+
+    async def async_start(self):
+        """Load pending jobs from .storage once and arm the timer."""
+        self._running = True
+        if self._loaded:
+            self._arm()
+            return
+        data = await self._store.async_load() or {}
+        early = bool(self._jobs)
+        for job in data.get("jobs", []):
+            # 加载前新加入的任务优先
+            if job["id"] not in self._jobs:
+                self._jobs[job["id"]] = job
+                heapq.heappush(self._heap, (job["due"], next(self._seq), job["id"]))
+        self._loaded = True
+        if early:
+            self._save()
+        _LOGGER.debug("Loaded %d scheduled notifications.", len(self._jobs))
+        self._arm()
+
+    def _data_to_save(self):
+        return {"jobs": list(self._jobs.values())}
+
+    def _save(self):
+        # 加载完成前保存会覆盖文件中尚未读入的任务
+        if self._loaded:
+            self._store.async_delay_save(self._data_to_save, 1)
+
+    @property
+    def pending(self):
+        return len(self._jobs)
+
+    @callback
+    def async_schedule(self, entry_id, when, message, kwargs, schedule_id=None):
+        """Queue a notify call for later; the same schedule_id replaces the old job."""
+        job_id = schedule_id or secrets.token_hex(8)
+        self._jobs[job_id] = {
+            "id": job_id,
+            "due": when.timestamp(),
+            "entry_id": entry_id,
+            "message": message,
+            "kwargs": kwargs,
+        }
+        heapq.heappush(self._heap, (when.timestamp(), next(self._seq), job_id))
+        self._save()
+        self._arm()
+        _LOGGER.debug("Notification %s scheduled at %s", job_id, when)
+        return job_id
+
+    @callback
+    def async_cancel(self, job_id):
+        """Cancel a scheduled notification; the heap entry is skipped lazily."""
+        if self._jobs.pop(job_id, None) is None:
+            return False
+        self._save()
+        return True
+
+    def _arm(self):
+        """Point the single timer at the earliest pending job."""
+        if not (self._loaded and self._running):
+            return
+        # 已取消或被替换的任务直接丢弃
+        while self._heap and (
+            self._heap[0][2] not in self._jobs or self._jobs[self._heap[0][2]]["due"] != self._heap[0][0]
+        ):
+            heapq.heappop(self._heap)
+        if not self._heap:
+            self._unarm()
+            return
+        due = self._heap[0][0]
+        if self._timer is not None and self._timer_at == due:
+            return
+        self._unarm()
+        self._timer_at = due
+        self._timer = async_track_point_in_utc_time(self.hass, self._fire, dt_util.utc_from_timestamp(due))
+
+    def _unarm(self):
+        if self._timer is not None:
+            self._timer()
+            self._timer = None
+            self._timer_at = None
+
+    @callback
+    def _fire(self, now):
+        self._timer = None
+        self._timer_at = None
+        now_ts = now.timestamp()
+        due_jobs = []
+        while self._heap and self._heap[0][0] <= now_ts:
+            due, _, job_id = heapq.heappop(self._heap)
+            job = self._jobs.get(job_id)
+            if job is None or job["due"] != due:
+                continue
+            del self._jobs[job_id]
+            due_jobs.append(job)
+        if due_jobs:
+            self._save()
+            self.hass.async_create_task(self._async_run(due_jobs, now_ts))
+        self._arm()
+
+    async def _async_run(self, jobs, now_ts):
+        services = self.hass.data[DOMAIN].get("notify_services", {})
+        for job in jobs:
+            if now_ts - job["due"] > SCHEDULE_MAX_LATENESS:
+                _LOGGER.warning("Drop scheduled notification %s, it is too late to send.", job["id"])
+                continue
+            service = services.get(job["entry_id"])
+            if service is None:
+                _LOGGER.warning("Drop scheduled notification %s, account %s is gone.", job["id"], job["entry_id"])
+                continue
+            try:
+                await service.async_send_message(job["message"], **job["kwargs"])
+            except Exception as e:
+                _LOGGER.error("Error sending scheduled notification %s: %s", job["id"], e)
+
+    @callback
+    def async_stop(self):
+        """Stop the timer; pending jobs stay in .storage until the next start."""
+        self._running = False
+        self._unarm()
@@ -1,24 +1,52 @@
 import logging
+from datetime import timedelta
 from homeassistant.components.sensor import SensorEntity
 from homeassistant.core import HomeAssistant
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant.components import persistent_notification
-from .const import DOMAIN, CONF_GEWE_TOKEN, CONF_APP_ID
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.entity import EntityCategory
+from homeassistant.util import slugify
+from .const import DOMAIN, CONF_GEWE_TOKEN, CONF_APP_ID, CONF_NICKNAME, CONF_WXID, SIGNAL_ONLINE_STATE
+from .accounts import is_legacy_account
+
+LEGACY_UNIQUE_ID = "gewe_notify_online_status"
 
 _LOGGER = logging.getLogger(__name__)
 
+# 在线状态主要由消息回调推送，轮询只作兜底
+SCAN_INTERVAL = timedelta(minutes=10)
+
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_entities):
     """Set up Gewe Notify sensor based on a config entry."""
-    api = hass.data[DOMAIN]["api"]
+    api = hass.data[DOMAIN]["entries"][entry.entry_id]["api"]
 
     # 从配置中获取 token 和 app_id
     token = entry.data[CONF_GEWE_TOKEN]
     app_id = entry.data[CONF_APP_ID]
 
+    # 旧版本的 unique_id 是固定值，迁移到按账号区分
+    registry = er.async_get(hass)
+    legacy_entity_id = registry.async_get_entity_id("sensor", DOMAIN, LEGACY_UNIQUE_ID)
+    if legacy_entity_id and registry.async_get(legacy_entity_id).config_entry_id == entry.entry_id:
+        registry.async_update_entity(legacy_entity_id, new_unique_id=f"{entry.entry_id}_online_status")
+
+    if is_legacy_account(entry):
+        name = "Gewe Notify Online Status"
+    else:
+        name = f"Gewe Notify {entry.data.get(CONF_NICKNAME) or entry.data.get(CONF_WXID)} Online Status"
+
     sensors = [
-            GeweOnlineSensor(api, token, app_id)
+            GeweOnlineSensor(api, token, app_id, entry.entry_id, name)
             ]
+    # 每个后端地址一个诊断传感器
+    sensors.extend(
+        GeweEndpointSensor(api.endpoints, endpoint, entry.entry_id, name.replace("Online Status", "Endpoint"))
+        for endpoint in api.endpoints.endpoints
+    )
 
     # 将传感器添加到系统中
     async_add_entities(sensors)
@@ -27,22 +55,38 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_e
 class GeweOnlineSensor(SensorEntity):
     """Representation of a Gewe Notify online sensor."""
 
-    def __init__(self, api, token, app_id):
+    def __init__(self, api, token, app_id, entry_id, name):
         self.api = api
         self.token = token
         self.app_id = app_id
+        self.entry_id = entry_id
+        self._name = name
         self._state = None
 
+    async def async_added_to_hass(self):
+        """Subscribe to online state pushed by the Gewe callback."""
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass, SIGNAL_ONLINE_STATE.format(self.entry_id), self._handle_push
+            )
+        )
+
+    @callback
+    def _handle_push(self, online):
+        """Update state from a pushed callback without polling."""
+        self._state = online
+        self.async_write_ha_state()
+
 
     @property
     def name(self):
         """Return the name of the sensor."""
-        return "Gewe Notify Online Status"
+        return self._name
 
     @property
     def unique_id(self):
         """Return a unique ID to use for this sensor."""
-        return "gewe_notify_online_status"
+        return f"{self.entry_id}_online_status"
 
     @property
     def state(self):
@@ -59,3 +103,29 @@ class GeweOnlineSensor(SensorEntity):
         except Exception as e:
             _LOGGER.error(f"Error fetching online status: {e}")
         _LOGGER.debug(f"Instance {self.api}. Gewe Notify sensor updated.state: {online_status}")
+
+
+class GeweEndpointSensor(SensorEntity):
+    """Health of one Gewe backend endpoint."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_should_poll = False
+    _attr_icon = "mdi:server-network"
+
+    def __init__(self, pool, endpoint, entry_id, name):
+        self.pool = pool
+        self.endpoint = endpoint
+        self._attr_name = f"{name} {endpoint.url}"
+        self._attr_unique_id = f"{entry_id}_endpoint_{slugify(endpoint.url)}"
+
+    async def async_added_to_hass(self):
+        """Refresh when the endpoint pool reports a change."""
+        self.async_on_remove(self.pool.async_add_listener(self.async_write_ha_state))
+
+    @property
+    def native_value(self):
+        return self.endpoint.state
+
+    @property
+    def extra_state_attributes(self):
+        return self.endpoint.as_dict()
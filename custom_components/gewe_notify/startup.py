@@ -0,0 +1,28 @@
+import time
+from contextlib import contextmanager
+
+class GeweStartupTimer:
+    """Record how long each phase of setting up an account took, for diagnostics."""
+
+    def __init__(self):
+        self.phases = {}
+        self.deferred_done = False
+        self._started = time.monotonic()
+
+    @contextmanager
+    def measure(self, phase):
+        """Time a block (sync or containing awaits) in milliseconds."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.phases[phase] = round((time.monotonic() - start) * 1000, 1)
+
+    def as_dict(self):
+        return {
+            "phases_ms": dict(self.phases),
+            "setup_ms": sum(
+                duration for phase, duration in self.phases.items() if not phase.startswith("deferred_")
+            ),
+            "deferred_done": self.deferred_done,
+        }
@@ -0,0 +1,56 @@
+import string
+from .cache import LRUCache
+from .const import TEMPLATE_CACHE_SIZE
+
+# 可用的接收人变量，来自 fetch_contacts 保存的通讯录
+TEMPLATE_VARIABLES = ("wxid", "name", "remark", "nickName")
+# 支持模板的消息字段
+TEMPLATE_FIELDS = ("content", "title", "desc")
+
+_FORMATTER = string.Formatter()
+_COMPILED = LRUCache(TEMPLATE_CACHE_SIZE)
+
+class GeweTemplate:
+    """A "{name}" style template parsed once and rendered with str.format."""
+
+    __slots__ = ("source", "fields", "_format")
+
+    def __init__(self, source):
+        self.source = source
+        pieces = []
+        fields = []
+        try:
+            parsed = list(_FORMATTER.parse(source))
+        except ValueError as e:
+            raise ValueError(f"Invalid template {source!r}: {e}") from e
+        for literal, field, format_spec, conversion in parsed:
+            pieces.append(literal.replace("{", "{{").replace("}", "}}"))
+            if field is None:
+                continue
+            if field not in TEMPLATE_VARIABLES or format_spec or conversion:
+                raise ValueError(
+                    f"Invalid template field {{{field}}}, available: {', '.join(TEMPLATE_VARIABLES)}"
+                )
+            # 改写成位置参数，渲染时不再解析字段名
+            pieces.append(f"{{{len(fields)}}}")
+            fields.append(field)
+        self.fields = tuple(fields)
+        self._format = "".join(pieces).format
+
+    def render(self, variables):
+        return self._format(*[variables[field] for field in self.fields])
+
+def compile_template(source):
+    """Return the compiled template of a source string, cached by source."""
+    template = _COMPILED.get(source)
+    if template is None:
+        template = GeweTemplate(source)
+        _COMPILED.set(source, template)
+    return template
+
+def contact_variables(wxid, contact=None):
+    """Template variables of one recipient; name falls back remark -> nickName -> wxid."""
+    contact = contact or {}
+    remark = contact.get("remark") or ""
+    nick_name = contact.get("nickName") or ""
+    return {"wxid": wxid, "name": remark or nick_name or wxid, "remark": remark, "nickName": nick_name}
@@ -0,0 +1,107 @@
+import re
+import unicodedata
+from .const import TEXT_MAX_BYTES, TEXT_MIN_BYTES
+
+# 段落 -> 行 -> 句子 -> 空白，逐级细分
+_SPLIT_PATTERNS = [
+    re.compile(r"(?<=\n\n)"),
+    re.compile(r"(?<=\n)"),
+    re.compile(r"(?<=[。！？；…])|(?<=[.!?;])(?=\s)"),
+    re.compile(r"(?<=\s)"),
+]
+_MARKER = "({index}/{total})\n"
+# 为分段标记预留的字节数，足够容纳 "(999/999)\n"
+_MARKER_RESERVE = 12
+
+_ZWJ = "‍"
+
+def _utf8_len(text):
+    return len(text.encode("utf-8"))
+
+def _is_extender(char):
+    """Characters that must stay attached to the previous one (emoji modifiers, marks)."""
+    code = ord(char)
+    return (
+        char == _ZWJ
+        or 0xFE00 <= code <= 0xFE0F  # variation selectors
+        or 0x1F3FB <= code <= 0x1F3FF  # skin tone modifiers
+        or 0xE0020 <= code <= 0xE007F  # tag sequences
+        or unicodedata.combining(char) != 0
+    )
+
+def _is_regional_indicator(char):
+    return 0x1F1E6 <= ord(char) <= 0x1F1FF
+
+def _safe_cut(text, start, cut):
+    """Move a cut point back so it does not land inside an emoji sequence."""
+    # 不在 ZWJ 序列、修饰符中间断开
+    while cut > start + 1 and (_is_extender(text[cut]) or text[cut - 1] == _ZWJ):
+        cut -= 1
+    # 国旗由两个 regional indicator 组成
+    if _is_regional_indicator(text[cut]):
+        run = 0
+        while cut - run - 1 >= start and _is_regional_indicator(text[cut - run - 1]):
+            run += 1
+        if run % 2 == 1 and cut - 1 > start:
+            cut -= 1
+    return cut
+
+def _hard_split(text, budget):
+    """Cut text into pieces of at most budget bytes without breaking emoji sequences."""
+    pieces = []
+    start = 0
+    while start < len(text):
+        size = 0
+        end = start
+        while end < len(text) and size + _utf8_len(text[end]) <= budget:
+            size += _utf8_len(text[end])
+            end += 1
+        if end < len(text):
+            end = _safe_cut(text, start, end) if end > start else start + 1
+        pieces.append(text[start:end])
+        start = end
+    return pieces
+
+def _segments(text, budget, level=0):
+    """Split text into atoms no larger than budget, preferring coarse boundaries."""
+    if _utf8_len(text) <= budget:
+        return [text]
+    if level >= len(_SPLIT_PATTERNS):
+        return _hard_split(text, budget)
+    result = []
+    for part in _SPLIT_PATTERNS[level].split(text):
+        if part:
+            result.extend(_segments(part, budget, level + 1))
+    return result
+
+def split_text(text, max_bytes=TEXT_MAX_BYTES, markers=True):
+    """Split a long text on paragraph, line and sentence boundaries.
+
+    Every returned part is at most max_bytes of UTF-8, including the
+    "(n/total)" marker prepended when markers is enabled.
+    Raises ValueError when max_bytes is below TEXT_MIN_BYTES.
+    """
+    if max_bytes < TEXT_MIN_BYTES:
+        raise ValueError(f"max_bytes must be at least {TEXT_MIN_BYTES}")
+    if not text or _utf8_len(text) <= max_bytes:
+        return [text]
+
+    budget = max_bytes - (_MARKER_RESERVE if markers else 0)
+    chunks = []
+    current = ""
+    current_size = 0
+    for atom in _segments(text, budget):
+        atom_size = _utf8_len(atom)
+        if current and current_size + atom_size > budget:
+            chunks.append(current)
+            current, current_size = "", 0
+        current += atom
+        current_size += atom_size
+    if current:
+        chunks.append(current)
+
+    chunks = [chunk.strip() for chunk in chunks if chunk.strip()]
+    if not markers or len(chunks) <= 1:
+        return chunks
+    total = len(chunks)
+    return [_MARKER.format(index=i, total=total) + chunk for i, chunk in enumerate(chunks, 1)]
@@ -0,0 +1,142 @@
+import time
+import voluptuous as vol
+from homeassistant.components import websocket_api
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.dispatcher import async_dispatcher_connect, async_dispatcher_send
+from .accounts import resolve_account
+from .const import DOMAIN, SIGNAL_CONTACTS_UPDATED, SIGNAL_MESSAGE_STATUS, WS_HISTORY_LIMIT
+from .contacts import CONTACT_KINDS
+
+@callback
+def async_publish_message_status(hass, entry_id, to_wxid, message_type, status, response=None, **extra):
+    """Push a send/delivery status change to websocket subscribers."""
+    response = response if isinstance(response, dict) else {}
+    async_dispatcher_send(hass, SIGNAL_MESSAGE_STATUS, {
+        "entry_id": entry_id,
+        "to_wxid": to_wxid,
+        "message_type": message_type,
+        "status": status,
+        "msg_id": response.get("msgId"),
+        "new_msg_id": response.get("newMsgId"),
+        "create_time": response.get("createTime"),
+        "ts": time.time(),
+        **extra,
+    })
+
+@callback
+def async_setup_websocket(hass: HomeAssistant):
+    """Register the websocket commands."""
+    websocket_api.async_register_command(hass, ws_subscribe_contacts)
+    websocket_api.async_register_command(hass, ws_subscribe_messages)
+
+def _filter_kinds(data, kinds):
+    return {kind: value for kind, value in data.items() if kind in kinds}
+
+@websocket_api.websocket_command({
+    vol.Required("type"): "gewe_notify/contacts/subscribe",
+    vol.Optional("account"): cv.string,
+    vol.Optional("kind"): vol.All(cv.ensure_list, [vol.In(CONTACT_KINDS)]),
+})
+@websocket_api.async_response
+async def ws_subscribe_contacts(hass, connection, msg):
+    """Send a contacts snapshot, then only the added/updated/removed contacts."""
+    runtime = resolve_account(hass, msg.get("account"))
+    if runtime is None:
+        connection.send_error(msg["id"], "not_found", "Gewe account not found")
+        return
+    entry_id = runtime["entry"].entry_id
+    kinds = msg.get("kind") or CONTACT_KINDS
+    snapshot = await hass.data[DOMAIN]["contacts"].async_get(entry_id)
+
+    @callback
+    def forward(diff):
+        diff = _filter_kinds(diff, kinds)
+        if diff:
+            connection.send_message(websocket_api.event_message(msg["id"], {"type": "diff", **diff}))
+
+    # 读取快照和订阅之间没有 await，不会漏掉变化
+    connection.subscriptions[msg["id"]] = async_dispatcher_connect(
+        hass, SIGNAL_CONTACTS_UPDATED.format(entry_id), forward
+    )
+    connection.send_result(msg["id"])
+    connection.send_message(websocket_api.event_message(msg["id"], {
+        "type": "snapshot",
+        "account": entry_id,
+        **{kind: list(contacts.values()) for kind, contacts in _filter_kinds(snapshot, kinds).items()},
+    }))
+
+@websocket_api.websocket_command({
+    vol.Required("type"): "gewe_notify/messages/subscribe",
+    vol.Optional("account"): cv.string,
+    vol.Optional("to_wxid"): vol.All(cv.ensure_list, [cv.string]),
+    vol.Optional("message_type"): vol.All(cv.ensure_list, [cv.string]),
+    vol.Optional("status"): vol.All(cv.ensure_list, [cv.string]),
+    vol.Optional("limit", default=20): vol.All(vol.Coerce(int), vol.Range(min=0, max=WS_HISTORY_LIMIT)),
+})
+@websocket_api.async_response
+async def ws_subscribe_messages(hass, connection, msg):
+    """Send recent messages from the history, then stream send status changes."""
+    entry_id = None
+    if msg.get("account"):
+        runtime = resolve_account(hass, msg["account"])
+        if runtime is None:
+            connection.send_error(msg["id"], "not_found", "Gewe account not found")
+            return
+        entry_id = runtime["entry"].entry_id
+    to_wxids = set(msg.get("to_wxid") or ())
+    message_types = set(msg.get("message_type") or ())
+    statuses = set(msg.get("status") or ())
+
+    def matches(message):
+        return (
+            (entry_id is None or message["entry_id"] == entry_id)
+            and (not to_wxids or message["to_wxid"] in to_wxids)
+            and (not message_types or message["message_type"] in message_types)
+            and (not statuses or message["status"] in statuses)
+        )
+
+    # 先订阅并缓存期间的变化，发送快照后再补发，不会漏掉
+    buffer = []
+
+    @callback
+    def forward(message):
+        if not matches(message):
+            return
+        if buffer is not None:
+            buffer.append(message)
+            return
+        connection.send_message(websocket_api.event_message(msg["id"], {"type": "status", **message}))
+
+    connection.subscriptions[msg["id"]] = async_dispatcher_connect(hass, SIGNAL_MESSAGE_STATUS, forward)
+
+    recent = []
+    if msg["limit"] and (not statuses or "sent" in statuses):
+        # 只有一个取值时在 SQL 里过滤，多个时取多一些再过滤
+        single = lambda values: next(iter(values)) if len(values) == 1 else None
+        try:
+            rows = await hass.data[DOMAIN]["history"].async_query(
+                entry_id=entry_id,
+                to_wxid=single(to_wxids),
+                message_type=single(message_types),
+                limit=msg["limit"] if len(to_wxids) <= 1 and len(message_types) <= 1 else WS_HISTORY_LIMIT * 10,
+            )
+        except Exception as e:
+            # 查询失败时退订，否则订阅会一直往缓存里塞消息
+            buffer = None
+            connection.subscriptions.pop(msg["id"])()
+            connection.send_error(msg["id"], "unknown_error", f"Error querying message history: {e}")
+            return
+        recent = [
+            message for message in ({**row, "status": "sent", "ts": row["sent_at"]} for row in rows)
+            if matches(message)
+        ][: msg["limit"]]
+
+    connection.send_result(msg["id"])
+    connection.send_message(websocket_api.event_message(msg["id"], {"type": "snapshot", "messages": recent}))
+    sent_ids = {message["new_msg_id"] for message in recent if message["new_msg_id"]}
+    pending, buffer = buffer, None
+    for message in pending:
+        if message["status"] == "sent" and message["new_msg_id"] in sent_ids:
+            continue
+        connection.send_message(websocket_api.event_message(msg["id"], {"type": "status", **message}))